@@ -1,9 +1,11 @@
 import sys
 import json
+import threading
 from threading import Thread
-from time import sleep
+from time import sleep, time
 from datetime import datetime
 import signal
+import numpy as np
 
 # those modules are imported dynamically during runtime
 # they are imported only if the corresponding class is used
@@ -11,19 +13,61 @@ import signal
 #import serial
 #import wiimote
 
+# number of values kept per capability in the history of a sensor
+HISTORY_SIZE = 1000
+
+# fixed-size history of timestamped values for one capability
+# timestamps and values are written twice (at i and i + size) like in SampleRing,
+# so the last n entries are always in order without rearranging anything
+# appending is O(1); there is only one writer, so no locks are needed
+class ValueHistory():
+    def __init__(self, size):
+        self.size = size
+        self._timestamps = np.zeros(2 * size)
+        self._values = [None] * (2 * size)
+        # total number of values appended so far
+        self.count = 0
+
+    def append(self, timestamp, value):
+        index = self.count % self.size
+        self._timestamps[index] = timestamp
+        self._timestamps[index + self.size] = timestamp
+        self._values[index] = value
+        self._values[index + self.size] = value
+        self.count += 1
+
+    # returns (timestamps, values) of the last n entries, oldest first
+    def get_window(self, n):
+        count = self.count
+        n = min(n, count, self.size)
+        end = count % self.size + self.size
+        return self._timestamps[end - n:end].copy(), self._values[end - n:end]
+
+    # returns (timestamps, values) of all entries with a timestamp later than t
+    def get_since(self, t):
+        timestamps, values = self.get_window(self.size)
+        start = np.searchsorted(timestamps, t, side='right')
+        return timestamps[start:], values[start:]
+
 class Sensor():
     # class variable that stores all instances of Sensor
     instances = []
 
-    def __init__(self):
+    def __init__(self, history_size=HISTORY_SIZE):
         # list of strings which represent capabilites, such as 'buttons' or 'accelerometer'
         self._capabilities = []
         # for each capability, store a list of callback functions
         self._callbacks = {}
+        # callback functions that get every message, whether its values changed or not
+        self._message_callbacks = []
         # for each capability, store the last value as an object
         self._data = {}
+        # for each capability, store the last history_size values with the time they were received
+        self._history_size = history_size
+        self._history = {}
         self._receiving = False
         Sensor.instances.append(self)
+        install_interrupt_handler()
 
     # stops the loop in _receive() and kills the thread
     # so the program can terminate smoothly
@@ -42,9 +86,19 @@ class Sensor():
         except json.decoder.JSONDecodeError:
             # incomplete data
             return
+        self._update_json(data_json)
+
+    def _update_json(self, data_json, timestamp=None):
+        # all values of one message share the same timestamp
+        if timestamp is None:
+            timestamp = time()
+        self._update_values(data_json, timestamp)
+        self._notify_message_callbacks(data_json, timestamp)
 
+    def _update_values(self, data_json, timestamp):
         for key, value in data_json.items():
             self._add_capability(key)
+            self._history[key].append(timestamp, value)
 
             # do not notify callbacks on initialization
             if self._data[key] == []:
@@ -65,6 +119,7 @@ class Sensor():
             self._capabilities.append(key)
             self._callbacks[key] = []
             self._data[key] = []
+            self._history[key] = ValueHistory(self._history_size)
 
     # returns a list of all current capabilities
     def get_capabilities(self):
@@ -79,6 +134,20 @@ class Sensor():
             #raise KeyError(f'"{key}" is not a capability of this sensor.')
             return None
 
+    # get the last n values for specified capability
+    # returns (timestamps, values), oldest first; timestamps are the times the values were received
+    def get_window(self, key, n):
+        if key not in self._history:
+            return np.zeros(0), []
+        return self._history[key].get_window(n)
+
+    # get all values for specified capability that were received after time t
+    # returns (timestamps, values), oldest first
+    def get_since(self, key, t):
+        if key not in self._history:
+            return np.zeros(0), []
+        return self._history[key].get_since(t)
+
     # register a callback function for a change in specified capability
     def register_callback(self, key, func):
         self._add_capability(key)
@@ -97,24 +166,83 @@ class Sensor():
         for func in self._callbacks[key]:
             func(self._data[key])
 
+    # register a callback function that is called with (timestamp, message) for every received message
+    # unlike the callbacks of a capability, it is also called if no value changed
+    def register_message_callback(self, func):
+        self._message_callbacks.append(func)
+
+    def unregister_message_callback(self, func):
+        if func in self._message_callbacks:
+            self._message_callbacks.remove(func)
+            return True
+        return False
+
+    def _notify_message_callbacks(self, data_json, timestamp):
+        for func in self._message_callbacks:
+            func(timestamp, data_json)
+
+# fixed-size ring buffer of accelerometer + gyroscope samples
+# each row holds the receive timestamp, acc x/y/z and gyro x/y/z
+# every row is written twice (at i and i + capacity), so the last n samples
+# are always contiguous and can be returned as a view without copying
+# there is only one writer (the receiving thread), so no locks are needed:
+# a row is completely written before the sample count is increased
+class SampleRing():
+    COLUMNS = ['timestamp', 'acc_x', 'acc_y', 'acc_z', 'gyro_x', 'gyro_y', 'gyro_z']
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self._rows = np.zeros((2 * capacity, len(SampleRing.COLUMNS)))
+        # total number of samples written so far (also the sequence number of the next sample)
+        self.count = 0
+
+    def append(self, timestamp, acc, gyro):
+        index = self.count % self.capacity
+        row = (timestamp, acc['x'], acc['y'], acc['z'], gyro['x'], gyro['y'], gyro['z'])
+        self._rows[index] = row
+        self._rows[index + self.capacity] = row
+        self.count += 1
+
+    # returns a view of the last n samples (fewer if not enough samples arrived yet)
+    # the view is overwritten after (capacity - n) further samples, copy it to keep it longer
+    def get_window(self, n):
+        count = self.count
+        n = min(n, count, self.capacity)
+        end = count % self.capacity + self.capacity
+        return self._rows[end - n:end]
+
+    # returns a view of all samples with a sequence number >= seq and the sequence number of the next sample
+    # if more than capacity samples arrived since seq, only the last capacity samples are returned
+    def get_since(self, seq):
+        count = self.count
+        return self.get_window(count - seq) if count > seq else self._rows[:0], count
+
 # sensor connected via WiFi/UDP
 # initialized with a UDP port
 # listens to all IPs by default
 # requires the socket module
+# if ring_size is given, the sensor runs in high-rate mode: all datagrams waiting
+# on the socket are read at once and accelerometer + gyroscope data are written
+# into a SampleRing (available as sensor.samples) instead of only keeping the last value
 class SensorUDP(Sensor):
-    def __init__(self, port, ip='0.0.0.0'):
-        Sensor.__init__(self)
+    def __init__(self, port, ip='0.0.0.0', ring_size=None, history_size=HISTORY_SIZE):
+        Sensor.__init__(self, history_size)
         self._ip = ip
         self._port = port
+        self.samples = SampleRing(ring_size) if ring_size else None
         self._connect()
 
     def _connect(self):
         import socket
 
         self._sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-        self._sock.settimeout(0.1)
         self._sock.bind((self._ip, self._port))
-        self._connection_thread = Thread(target=self._receive)
+        if self.samples is not None:
+            self._sock.setblocking(False)
+            self._connection_thread = Thread(target=self._receive_batches)
+        else:
+            self._sock.settimeout(0.1)
+            self._connection_thread = Thread(target=self._receive)
         self._connection_thread.start()
 
     def _receive(self):
@@ -130,6 +258,68 @@ class SensorUDP(Sensor):
                 continue
             self._update(data_decoded)
 
+    # waits until the socket is readable, then drains all waiting datagrams
+    def _receive_batches(self):
+        import selectors
+
+        selector = selectors.DefaultSelector()
+        selector.register(self._sock, selectors.EVENT_READ)
+        self._receiving = True
+        while self._receiving:
+            if not selector.select(timeout=0.1):
+                continue
+            while True:
+                try:
+                    data = self._sock.recv(1024)
+                except (BlockingIOError, InterruptedError):
+                    break
+                except OSError:
+                    # e.g. ICMP port unreachable errors reported on the socket
+                    continue
+                self._update_samples(data, time())
+        selector.close()
+
+    # fast path for datagrams in the DIPPID schema
+    # accelerometer and gyroscope values go straight into the ring buffer and are
+    # stored as last value; callbacks are only compared and notified if there are any
+    # all other keys (e.g. buttons) are handled like in _update()
+    def _update_samples(self, data, timestamp):
+        try:
+            # json.loads accepts the raw bytes, no need to decode them first
+            data_json = json.loads(data)
+        except (json.decoder.JSONDecodeError, UnicodeDecodeError):
+            # incomplete data
+            return
+        if not isinstance(data_json, dict):
+            return
+
+        # the message callbacks get the whole message, after all values were stored
+        message = dict(data_json) if self._message_callbacks else None
+        acc = data_json.pop('accelerometer', None)
+        gyro = data_json.pop('gyroscope', None)
+        if acc is not None and gyro is not None:
+            try:
+                self.samples.append(timestamp, acc, gyro)
+            except (KeyError, TypeError, ValueError):
+                # unexpected format
+                pass
+
+        for key, value in (('accelerometer', acc), ('gyroscope', gyro)):
+            if value is None:
+                continue
+            if key not in self._data:
+                self._add_capability(key)
+            self._history[key].append(timestamp, value)
+            previous = self._data[key]
+            self._data[key] = value
+            if self._callbacks[key] and previous != [] and previous != value:
+                self._notify_callbacks(key)
+
+        if data_json:
+            self._update_values(data_json, timestamp)
+        if message is not None:
+            self._notify_message_callbacks(message, timestamp)
+
 # sensor connected via serial connection (USB)
 # initialized with a path to a TTY (e.g. /dev/ttyUSB0)
 # default baudrate is 115200
@@ -197,6 +387,7 @@ class SensorWiimote(Sensor):
 
     def _update(self, key, value):
         self._add_capability(key)
+        self._history[key].append(time(), value)
         
         # do not notify callbacks on initialization
         if self._data[key] == []:
@@ -214,4 +405,13 @@ def handle_interrupt_signal(signal, frame):
         sensor.disconnect()
     sys.exit(0)
 
-signal.signal(signal.SIGINT, handle_interrupt_signal)
+# The handler is installed when the first sensor is created instead of on import, so importing this module
+# has no side effects. Signal handlers can only be installed from the main thread
+_interrupt_handler_installed = False
+
+def install_interrupt_handler():
+    global _interrupt_handler_installed
+    if _interrupt_handler_installed or threading.current_thread() is not threading.main_thread():
+        return
+    signal.signal(signal.SIGINT, handle_interrupt_signal)
+    _interrupt_handler_installed = True
@@ -1,185 +1,462 @@
-import pandas as pd
+import os
+import json
+import time
+import threading
+from collections import namedtuple
 import numpy as np
 from pathlib import Path
-from scipy import signal
-from sklearn import svm
-from sklearn.preprocessing import StandardScaler
-from sklearn.multiclass import OneVsOneClassifier
-from sklearn import svm, model_selection, metrics
 from DIPPID import SensorUDP
-from utils import DIRECTORY, LABEL_DICT
-from collections import deque
+from utils import DIRECTORY, MODEL_PATH, FEATURE_CACHE_PATH, PARAMS_PATH, RUNTIME_PATH, LABEL_DICT
+import features
+import classifiers
+import model_store
+import runtime
+import recordings
+import dataset_index
+from resampler import StreamResampler
 
 PORT = 5700
-LIVE_DATA_SIZE = 50
+LIVE_DATA_SIZE = 50     # Default number of samples in a window, for training and live prediction
+WINDOW_STRIDE = 10      # Default number of samples between the starts of two training windows
+RING_SIZE = 1024    # Number of incoming samples the sensor keeps until they are processed
+INFERENCE_INTERVAL = 0.05   # Seconds between two predictions of the RecognitionWorker
+TRAINING_SEED = 0   # Seed of the holdout split and the classifier, so that training is reproducible
+HOLDOUT_SIZE = 0.2  # Share of the participants whose recordings are used to test the classifier
+
+# Inverse of LABEL_DICT: CLASS_LABELS[class] is the label of a class
+CLASS_LABELS = np.empty(max(LABEL_DICT.values()) + 1, dtype=object)
+for label, value in LABEL_DICT.items():
+    CLASS_LABELS[value] = label
+
+
+# The training samples: one row of features per window, tagged with the class (activity), the participant
+# and the file of the recording it was cut from
+TrainingData = namedtuple('TrainingData', ['samples', 'classes', 'groups', 'files'])
+
+
+# Load the parameters found by the search in training.py. Returns an empty dict if there are none
+
+def load_params(path=None):
+    path = path or PARAMS_PATH
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
 
 class Recognizer:
 
-    def __init__(self):
-        self.live_data = deque(maxlen=LIVE_DATA_SIZE)
+    # With listen=False no sensor is opened, e.g. if the live data comes from a RecognitionServer.
+    # With saved_params=False the parameters found by training.py are not used, only the defaults
+
+    def __init__(self, listen=True, port=PORT, saved_params=True):
         self.order = 1  # Order for the Butterworth filter
         self.sampling_rate = 100    # Sampling rate for the Butterworth filter
         self.cutoff_frequency = 3   # Cutoff frequency or the Butterworth filter
-        self.butter_filter = signal.butter(self.order, self.cutoff_frequency, btype="low", analog=False, output="sos", fs=self.sampling_rate)
+        # Every recording is cut into windows of window_size samples for training, one every window_stride samples.
+        # Live prediction uses windows of the same size
+        self.window_size = LIVE_DATA_SIZE
+        self.window_stride = WINDOW_STRIDE
+        self.classifier_name = classifiers.DEFAULT_CLASSIFIER  # One of classifiers.CLASSIFIERS
+        self.classifier_params = {}     # Passed to set_params of the classifier, e.g. {'estimator__C': 1}
+        # Live data is resampled to the sampling rate of the training data, so that training and
+        # prediction see the same timing. Gaps are interpolated because the window needs a value for every bin.
+        # Set to None if the data already arrives at the sampling rate
+        # Gaps longer than a window are not interpolated, the live window starts over after them
+        self.live_resampler = StreamResampler(self.sampling_rate, method='linear', max_gap=LIVE_DATA_SIZE)
+        # Criteria the training files are selected by (see dataset_index.DatasetIndex.get_rejections)
+        self.data_selection = {}
+        # Use the model compiled by export_runtime.py if it is up to date. It predicts without scikit-learn, and
+        # its filter is used without scipy if it was made with the same parameters
+        self.use_runtime = True
+        # Creates the filter and the live window. Parameters saved by the search in training.py replace the defaults
+        self.set_params(load_params() if saved_params else {})
+        # Number of workers that load the training data (None: one per core). Threads are used by default, because
+        # worker processes import the main script again on platforms that spawn them (e.g. Windows)
+        self.training_workers = None
+        self.training_processes = False
         self.finished_training = False  # Track if training the classifier has finished
         self.got_live_data = False      # Track if enough live data from the input device is available
-        self.sensor = SensorUDP(PORT)
+        self.sensor = SensorUDP(port, ring_size=RING_SIZE) if listen else None
+        self.next_sample = 0    # Sequence number of the first sample in the sensor's ring buffer not processed yet
+        self.last_sample_time = 0   # Receive time of the last processed sample (if the sensor has no ring buffer)
 
         self.classifier = None
         self.scaler = None
 
-    # Filter the signal
+    # Change the filter, window and classifier parameters. params may contain order, cutoff_frequency, window_size,
+    # window_stride, classifier, classifier_params and data_selection, the others keep their value.
+    # A trained classifier has to be trained again afterwards
+
+    def set_params(self, params):
+        self.order = params.get('order', self.order)
+        self.cutoff_frequency = params.get('cutoff_frequency', self.cutoff_frequency)
+        self.window_size = params.get('window_size', self.window_size)
+        self.window_stride = params.get('window_stride', self.window_stride)
+        # The parameters of one classifier don't apply to another one
+        if params.get('classifier', self.classifier_name) != self.classifier_name:
+            self.classifier_params = {}
+        self.classifier_name = params.get('classifier', self.classifier_name)
+        self.classifier_params = params.get('classifier_params', self.classifier_params)
+        self.data_selection = params.get('data_selection', self.data_selection)
+        sos = runtime.load_filter(RUNTIME_PATH, self.order, self.cutoff_frequency, self.sampling_rate) if self.use_runtime else None
+        self.butter_filter = sos if sos is not None else features.make_filter(self.order, self.cutoff_frequency, self.sampling_rate)
+        # Features of the last window_size samples from the input device, updated with every new sample
+        self.live_window = features.SlidingWindowFeatures(self.window_size, self.butter_filter, self.sampling_rate)
+        if self.live_resampler is not None:
+            self.live_resampler.max_gap = self.window_size
+
+    # Filter the signal. data is an (N, 6) array with the channels in CHANNELS order
 
-    def apply_filter(self, df):
-        df = df.copy()
-        df["acc_x_filtered"] = signal.sosfilt(self.butter_filter, df["acc_x"])
-        df["acc_y_filtered"] = signal.sosfilt(self.butter_filter, df["acc_y"])
-        df["acc_z_filtered"] = signal.sosfilt(self.butter_filter, df["acc_z"])
-        df["gyro_x_filtered"] = signal.sosfilt(self.butter_filter, df["gyro_x"])
-        df["gyro_y_filtered"] = signal.sosfilt(self.butter_filter, df["gyro_y"])
-        df["gyro_z_filtered"] = signal.sosfilt(self.butter_filter, df["gyro_z"])
-        return df
+    def apply_filter(self, data):
+        return features.apply_filter(data, self.butter_filter)
 
 
-    # Get the dominant frequency of the signal
+    # Get the dominant frequency of every channel of the (filtered) signal
 
     def get_dominant_frequency(self, data):
-        spectrum = np.abs(np.fft.fft(data))
-        frequencies = np.fft.fftfreq(len(data), 1/self.sampling_rate)
-        mask = frequencies >= 0
-        spectrum = spectrum[mask]
-        frequencies = frequencies[mask]
-        return frequencies[np.argmax(spectrum)]
-
-
-    # Preprocess the training data and get the features used for training
-
-    def extract_features(self, csv_df, label=None):
-        csv_df = csv_df.dropna()
-        csv_df = self.apply_filter(csv_df)
-        features = {
-            "max_acc_x": csv_df["acc_x_filtered"].max(),
-            "min_acc_x": csv_df["acc_x_filtered"].min(),
-            "mean_acc_x": csv_df["acc_x_filtered"].mean(),
-            "dominant_freq_acc_x": self.get_dominant_frequency(csv_df["acc_x_filtered"]),
-            "std_acc_x": csv_df["acc_x_filtered"].std(),
-            "var_acc_x": csv_df["acc_x_filtered"].var(),
-            "max_acc_y": csv_df["acc_y_filtered"].max(),
-            "min_acc_y": csv_df["acc_y_filtered"].min(),
-            "mean_acc_y": csv_df["acc_y_filtered"].mean(),
-            "dominant_freq_acc_y": self.get_dominant_frequency(csv_df["acc_y_filtered"]),
-            "std_acc_y": csv_df["acc_y_filtered"].std(),
-            "var_acc_y": csv_df["acc_y_filtered"].var(),
-            "max_acc_z": csv_df["acc_z_filtered"].max(),
-            "min_acc_z": csv_df["acc_z_filtered"].min(),
-            "mean_acc_z": csv_df["acc_z_filtered"].mean(),
-            "dominant_freq_acc_z": self.get_dominant_frequency(csv_df["acc_z_filtered"]),
-            "std_acc_z": csv_df["acc_z_filtered"].std(),
-            "var_acc_z": csv_df["acc_z_filtered"].var(),
-            "max_gyro_x": csv_df["gyro_x_filtered"].max(),
-            "min_gyro_x": csv_df["gyro_x_filtered"].min(),
-            "mean_gyro_x": csv_df["gyro_x_filtered"].mean(),
-            "dominant_freq_gyro_x": self.get_dominant_frequency(csv_df["gyro_x_filtered"]),
-            "std_gyro_x": csv_df["gyro_x_filtered"].std(),
-            "var_gyro_x": csv_df["gyro_x_filtered"].var(),
-            "max_gyro_y": csv_df["gyro_y_filtered"].max(),
-            "min_gyro_y": csv_df["gyro_y_filtered"].min(),
-            "mean_gyro_y": csv_df["gyro_y_filtered"].mean(),
-            "dominant_freq_gyro_y": self.get_dominant_frequency(csv_df["gyro_y_filtered"]),
-            "std_gyro_y": csv_df["gyro_y_filtered"].std(),
-            "var_gyro_y": csv_df["gyro_y_filtered"].var(),
-            "max_gyro_z": csv_df["gyro_z_filtered"].max(),
-            "min_gyro_z": csv_df["gyro_z_filtered"].min(),
-            "mean_gyro_z": csv_df["gyro_z_filtered"].mean(),
-            "dominant_freq_gyro_z": self.get_dominant_frequency(csv_df["gyro_z_filtered"]),
-            "std_gyro_z": csv_df["gyro_z_filtered"].std(),
-            "var_gyro_z": csv_df["gyro_z_filtered"].var(),
-    }
-
-        if label is not None:
-            features["label"] = label
-
-        return pd.DataFrame([features])
-
-
-    # Get the incoming data from the input device
+        return features.dominant_frequencies(data, self.sampling_rate)
+
+
+    # Preprocess the sensor data and get the features used for training and prediction.
+    # Returns a vector with the features in FEATURE_NAMES order
+
+    def extract_features(self, data):
+        return features.extract_features(data, self.butter_filter, self.sampling_rate)
+
+
+    # Cut a whole recording of shape (N, 6) into training windows and get their features as a (W, 36) array
+
+    def extract_window_features(self, data):
+        return features.window_features(data, self.butter_filter, self.sampling_rate, self.window_size, self.window_stride)
+
+
+    # Get every sample that arrived from the input device since the last call as a list of (timestamp, values).
+    # In high-rate mode the samples are read from the sensor's ring buffer, otherwise from the timestamped
+    # histories of accelerometer and gyroscope (values received in the same datagram share their timestamp)
 
     def get_live_data(self):
-        if self.sensor.has_capability('accelerometer') and self.sensor.has_capability('gyroscope'):
-            acc_data = self.sensor.get_value('accelerometer')
-            gyro_data = self.sensor.get_value('gyroscope')
-            return {
-                'acc_x': acc_data['x'],
-                'acc_y': acc_data['y'],
-                'acc_z': acc_data['z'],
-                'gyro_x': gyro_data['x'],
-                'gyro_y': gyro_data['y'],
-                'gyro_z': gyro_data['z']
-            }
-        return None
+        if self.sensor is None:
+            return []
+        samples = getattr(self.sensor, 'samples', None)
+        if samples is not None:
+            rows, self.next_sample = samples.get_since(self.next_sample)
+            return [(row[0], row[1:]) for row in rows]
+
+        acc_times, acc_values = self.sensor.get_since('accelerometer', self.last_sample_time)
+        gyro_times, gyro_values = self.sensor.get_since('gyroscope', self.last_sample_time)
+        gyro_by_time = dict(zip(gyro_times, gyro_values))
+        live_data = []
+        for timestamp, acc_data in zip(acc_times, acc_values):
+            gyro_data = gyro_by_time.get(timestamp)
+            if acc_data and gyro_data:
+                live_data.append((timestamp, [acc_data['x'], acc_data['y'], acc_data['z'], gyro_data['x'], gyro_data['y'], gyro_data['z']]))
+        if len(acc_times):
+            self.last_sample_time = acc_times[-1]
+        return live_data
+
+
+    # Get the csv files used for training. The dataset index is updated, then the recordings are selected by
+    # data_selection. Recordings that are too short, have too many missing values or duplicate another one are left out
+
+    def get_training_files(self):
+        return dataset_index.select_files(DIRECTORY, **self.data_selection)
+
+
+    # Parameters that influence the extracted features. Cached features are only used if they haven't changed
+
+    def get_feature_params(self):
+        return {
+            'order': self.order,
+            'sampling_rate': self.sampling_rate,
+            'cutoff_frequency': self.cutoff_frequency,
+            'window_size': self.window_size,
+            'window_stride': self.window_stride,
+            'features': features.FEATURE_NAMES,
+        }
+
+
+    # Parameters that influence the trained model. A saved model is only used if they haven't changed
+
+    def get_model_params(self):
+        return {
+            **self.get_feature_params(),
+            'classifier': self.classifier_name,
+            'classifier_params': self.classifier_params,
+        }
+
+
+    # Load the saved classifier if it was trained with the current training files and parameters, preferably the
+    # compiled one (see runtime.py). Otherwise train a new classifier and save it for the next start
+
+    def load_or_train_classifier(self):
+        files = self.get_training_files()
+        fingerprint = model_store.get_fingerprint(files, self.get_model_params())
+        compiled = runtime.load_model(RUNTIME_PATH, fingerprint) if self.use_runtime else None
+        if compiled is not None:
+            _, self.scaler, self.classifier = compiled
+            print("Loaded compiled classifier.")
+            self.finished_training = True
+            return
+
+        model = model_store.load_model(MODEL_PATH, fingerprint)
+        if model is not None:
+            self.scaler, self.classifier = model
+            print("Loaded saved classifier.")
+            self.finished_training = True
+            return
+
+        self.train_classifier(files)
+        model_store.save_model(MODEL_PATH, self.scaler, self.classifier, fingerprint)
+
+
+    # Create the (untrained) classifier
+
+    def create_classifier(self):
+        return classifiers.make_classifier(self.classifier_name, TRAINING_SEED).set_params(**self.classifier_params)
+
+
+    # Load the given csv files, cut them into windows and extract the features of every window. Files that haven't
+    # changed since the last training get their features from the cache, all others are loaded in parallel.
+    # Returns TrainingData with one sample per window
+
+    def load_training_data(self, files):
+        params = self.get_feature_params()
+        cache = model_store.FeatureCache(FEATURE_CACHE_PATH)
+        file_samples = cache.get_many(files, params, lambda missing: recordings.featurize_files(missing, params, self.training_workers, self.training_processes))
+        cache.evict_missing()
+        cache.save()
+
+        # Every window gets the tags of its file. The label comes from the subdirectory and is mapped to a numeric value
+        window_counts = [len(samples) for samples in file_samples]
+        classes = [LABEL_DICT[recordings.get_activity(csv)] for csv in files]
+        groups = [recordings.get_participant(csv) for csv in files]
+        # The feature matrix has a fixed column order (FEATURE_NAMES)
+        return TrainingData(
+            np.concatenate(file_samples) if file_samples else np.empty((0, features.NUM_FEATURES)),
+            np.repeat(classes, window_counts),
+            np.repeat(groups, window_counts),
+            np.repeat([Path(csv).as_posix() for csv in files], window_counts),
+        )
 
 
     # Training the classifier
     
-    def train_classifier(self):
+    def train_classifier(self, files=None):
+        # scikit-learn takes long to import and isn't needed if a saved model is used, so it is imported here
+        from sklearn.preprocessing import StandardScaler
+        from sklearn import model_selection, metrics
         print("Starting classifier training...")
-        data_list = []
-        # Load all csv files in DIRECTORY. Get the label from their subdirectory and extract their features
-        for csv in Path(DIRECTORY).rglob('*.csv'):
-            csv_df = pd.read_csv(csv)
-            label = csv.parent.name
-            data_list.append(self.extract_features(csv_df, label=label))
-
-        df = pd.concat(data_list, ignore_index=True)
-        df_to_scale = df.drop(columns=['label'])
-
-        # Map the activity labels to numeric values
-        df['class'] = df['label'].map(LABEL_DICT)
+        if files is None:
+            files = self.get_training_files()
+        samples, classes, groups, _ = self.load_training_data(files)
 
         # Standardize features via scaling
         scaler = StandardScaler()
-        scaled_samples = scaler.fit_transform(df_to_scale)
+        scaled_samples = scaler.fit_transform(samples)
 
-        # Split the training data 80/20
-        features_train, features_test, classes_train, classes_test = model_selection.train_test_split(scaled_samples, df['class'], test_size=0.2)
+        # Hold out all recordings of some participants, so that the accuracy shows how well the classifier works for
+        # people it hasn't seen. The split is seeded, so the same files always give the same classifier
+        splitter = model_selection.GroupShuffleSplit(n_splits=1, test_size=HOLDOUT_SIZE, random_state=TRAINING_SEED)
+        train_index, test_index = next(splitter.split(scaled_samples, classes, groups))
 
-        classifier = OneVsOneClassifier(svm.SVC(kernel='poly'))
-        classifier.fit(features_train, classes_train)
+        classifier = self.create_classifier()
+        classifier.fit(scaled_samples[train_index], classes[train_index])
 
         # Test the classifier
-        pred = classifier.predict(features_test)
-        print(f"Accuracy: {metrics.accuracy_score(classes_test, pred):.2%}")
+        pred = classifier.predict(scaled_samples[test_index])
+        print(f"Accuracy: {metrics.accuracy_score(classes[test_index], pred):.2%} (held out: {', '.join(sorted(set(groups[test_index])))})")
         print("Classifier training complete.")
-        self.finished_training = True
 
         self.classifier = classifier
         self.scaler = scaler
+        self.finished_training = True
     
 
+    # Start over with an empty live window, e.g. when a new activity starts. The resampler doesn't interpolate
+    # between the old and the new data either
+
+    def reset_live_data(self):
+        self.live_window.reset()
+        if self.live_resampler is not None:
+            self.live_resampler.reset()
+
+
+    # Get the incoming data from the DIPPID device, resample it and add it to the sliding window.
+    # Returns the features of the window once it has enough values, otherwise None. If min_samples is given,
+    # the features of a window that is not full yet are returned as soon as it has min_samples values
+
+    def update_live_window(self, min_samples=None):
+        for timestamp, values in self.get_live_data():
+            if self.live_resampler is None:
+                self.live_window.push(values)
+                continue
+            for _, resampled in self.live_resampler.push(timestamp, values):
+                if np.isnan(resampled).any():
+                    # The data paused for longer than a window (see StreamResampler.max_gap)
+                    self.live_window.reset()
+                    continue
+                self.live_window.push(resampled)
+
+        if not self.live_window.is_full():
+            if min_samples is not None and self.live_window.count >= min_samples:
+                return self.live_window.get_partial_features()
+            return None
+        # The features are kept up to date incrementally and come in the same fixed order as the training data
+        self.got_live_data = True
+        return self.live_window.get_features()
+
+
+    # Get the score of every class (in the order of classifier.classes_) for a matrix of scaled feature vectors:
+    # the probabilities if the classifier provides them, otherwise the softmax of the decision function
+
+    def predict_scores(self, features_scaled):
+        if hasattr(self.classifier, 'predict_proba'):
+            return self.classifier.predict_proba(features_scaled)
+        scores = self.classifier.decision_function(features_scaled)
+        scores = np.exp(scores - scores.max(axis=1, keepdims=True))
+        return scores / scores.sum(axis=1, keepdims=True)
+
+
+    # Classify a matrix of scaled feature vectors. Returns the predicted labels and the confidence of each
+    # prediction, i.e. the score of the predicted class
+
+    def classify_scaled(self, features_scaled):
+        scores = self.predict_scores(features_scaled)
+        # The predicted class is the most probable one, so the classifier only runs once
+        class_index = np.argmax(scores, axis=1)
+        pred_classes = self.classifier.classes_[class_index]
+        confidences = scores[np.arange(len(pred_classes)), class_index]
+        # Get the labels by the predicted class values
+        return CLASS_LABELS[pred_classes], confidences
+
+
+    # Apply the same scaler used during training to a matrix of feature vectors
+
+    def scale(self, feature_matrix):
+        return self.scaler.transform(feature_matrix)
+
+
+    # Classify one feature vector. Returns the predicted label and the confidence of the prediction
+
+    def classify(self, feature_vector):
+        features_scaled = self.scale(feature_vector.reshape(1, -1))
+        pred_labels, confidences = self.classify_scaled(features_scaled)
+        return pred_labels[0], float(confidences[0])
+
+
+    # Get the probability of every class for one feature vector, in the order of CLASS_LABELS
+
+    def get_probabilities(self, feature_vector):
+        scores = self.predict_scores(self.scale(feature_vector.reshape(1, -1)))[0]
+        probabilities = np.zeros(len(CLASS_LABELS))
+        probabilities[self.classifier.classes_] = scores
+        return probabilities
+
+
+    # Classify the windows of many recordings at once, e.g. to evaluate them. Every recording (an (N, 6) array) is
+    # filtered as a whole and cut into windows every stride samples (default: window_stride), exactly like the
+    # training data, so the features are the same the classifier was trained on. Scaling and prediction run once
+    # for all windows. Returns an array with the labels of all windows, recording after recording, and, if
+    # return_confidence is set, an array with their confidences
+
+    def predict_batch(self, recordings_data, stride=None, return_confidence=False):
+        stride = stride or self.window_stride
+        window_features = [features.window_features(data, self.butter_filter, self.sampling_rate, self.window_size, stride)
+                           for data in recordings_data]
+        features_scaled = self.scale(np.concatenate(window_features) if window_features else np.empty((0, features.NUM_FEATURES)))
+        pred_labels, confidences = self.classify_scaled(features_scaled)
+        if return_confidence:
+            return pred_labels, confidences
+        return pred_labels
+
+
     def predict_live_data(self):
-        # Get the incoming data from the DIPPID device and append it to a list
-        new_data = self.get_live_data()
-        if new_data:
-            self.live_data.append(new_data)
-
-        if len(self.live_data) == LIVE_DATA_SIZE:
-            # Once the list has enough values, convert the list to a DataFrame and extract the features
-            self.got_live_data = True
-            feature_df = self.extract_features(pd.DataFrame(self.live_data))
-
-            # Reorder the columns so they match the training data
-            ordered_df = feature_df[self.scaler.feature_names_in_]
-            
-            # Apply the same scaler used during training
-            ordered_df_scaled = self.scaler.transform(ordered_df)
-
-            # Predict the data. Get the label by the predicted class value
-            pred_class = self.classifier.predict(ordered_df_scaled)[0]
-            pred_label = None
-            for key, value in LABEL_DICT.items():
-                if value == pred_class:
-                    pred_label = key
-                    break
-                
+        feature_vector = self.update_live_window()
+        if feature_vector is not None:
+            pred_label, _ = self.classify(feature_vector)
             # Return the label so that fitness_trainer can check if it matches the required activity
-            return pred_label
\ No newline at end of file
+            return pred_label
+
+
+# The latest prediction of the recognition worker
+Prediction = namedtuple('Prediction', ['label', 'timestamp', 'confidence'])
+
+
+# Runs the live prediction on its own thread, independent of the UI. The latest prediction is published by
+# replacing a single attribute, which is atomic, so readers never need a lock and never wait for a prediction.
+# With a DecisionFilter the published prediction is its smoothed decision instead of the latest window's class.
+# With a SessionLog (see session_log.py) every classified window is logged
+
+class RecognitionWorker:
+
+    def __init__(self, recognizer, interval=INFERENCE_INTERVAL, decision=None, session_log=None):
+        self.recognizer = recognizer
+        self.interval = interval    # Seconds between two predictions
+        self.decision = decision    # DecisionFilter or None
+        self.session_log = session_log  # SessionLog or None
+        self.latest = None          # Prediction or None
+        self._running = False
+        self._reset = False
+        self._thread = None
+
+    def start(self):
+        if self._running:
+            return
+        self._running = True
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._running = False
+        if self._thread:
+            self._thread.join()
+
+    # Start over with an empty window and no decision, e.g. when a new activity starts. The reset happens on the
+    # worker's thread before its next prediction
+
+    def reset(self):
+        self.latest = None
+        self._reset = True
+
+    def get_latest(self):
+        return self.latest
+
+    def _predict(self):
+        if self.decision is None:
+            feature_vector = self.recognizer.update_live_window()
+            if feature_vector is not None:
+                label, confidence = self.recognizer.classify(feature_vector)
+                self.latest = Prediction(label, time.time(), confidence)
+                if self.session_log is not None:
+                    self.session_log.log(self.latest.timestamp, feature_vector, None, label, confidence)
+            return
+
+        feature_vector = self.recognizer.update_live_window(self.decision.early_min_samples)
+        if feature_vector is not None:
+            partial = not self.recognizer.live_window.is_full()
+            probabilities = self.recognizer.get_probabilities(feature_vector)
+            self.decision.update(probabilities, time.monotonic(), partial)
+            if self.decision.label is not None:
+                self.latest = Prediction(self.decision.label, time.time(), self.decision.confidence)
+            if self.session_log is not None:
+                self.session_log.log(time.time(), feature_vector, probabilities, self.decision.label, self.decision.confidence, partial)
+
+    def _run(self):
+        next_time = time.monotonic()
+        while self._running:
+            if self._reset:
+                self._reset = False
+                self.recognizer.reset_live_data()
+                if self.decision is not None:
+                    self.decision.reset()
+                self.latest = None
+            if self.recognizer.finished_training:
+                self._predict()
+
+            # Keep a steady rate. If a prediction took too long, continue from now instead of catching up
+            next_time += self.interval
+            delay = next_time - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            else:
+                next_time = time.monotonic()
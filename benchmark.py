@@ -0,0 +1,206 @@
+import os
+import sys
+import json
+import time
+import shutil
+import platform
+import argparse
+import tempfile
+import subprocess
+import tracemalloc
+from pathlib import Path
+import numpy as np
+from sklearn.preprocessing import StandardScaler
+import features
+import classifiers
+import recordings
+from activity_recognizer import Recognizer
+from utils import DIRECTORY, LABEL_DICT
+
+# Times the stages of training and prediction separately, on the recordings in DIRECTORY and on synthetic corpora
+# that are larger by a factor of scale (copies of the recordings with a little noise added).
+# For every stage the wall time, the peak memory allocated while it ran and, where it makes sense, percentiles
+# of the time per item (file or window) are measured. Results are written as json to RESULTS_DIR.
+# tracemalloc slows everything down a lot, so the memory is measured in a second run over at most MEMORY_ITEMS items
+
+RESULTS_DIR = 'benchmark_results/'
+WINDOW_STRIDE = 10      # Stride between the windows used for the prediction stages
+NOISE = 0.01            # Standard deviation of the noise added to the copies in synthetic corpora
+MEMORY_ITEMS = 100      # Number of items the peak memory is measured on
+# The prediction stages use the same number of windows at every scale. Their cost depends on the size of the
+# trained model (e.g. the number of support vectors), not on the number of windows in the corpus
+SINGLE_WINDOWS = 500    # Number of windows classified one by one
+BATCH_WINDOWS = 10000   # Number of windows classified in one batch (at most as many as all recordings have)
+LIVE_SAMPLES = 500      # Number of samples pushed into the live window
+
+
+# Run func once for every item and measure it. Returns the results and the measurements
+
+def run_stage(name, func, items):
+    item_times = []
+    results = []
+    start_time = time.perf_counter()
+    for item in items:
+        item_start = time.perf_counter()
+        results.append(func(item))
+        item_times.append(time.perf_counter() - item_start)
+    wall_time = time.perf_counter() - start_time
+
+    tracemalloc.start()
+    for item in items[:MEMORY_ITEMS]:
+        func(item)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    item_times = np.array(item_times) * 1000
+    measurement = {
+        'stage': name,
+        'items': len(item_times),
+        'wall_s': wall_time,
+        'peak_mb': peak / 2**20,
+    }
+    if len(item_times) > 1:
+        measurement['per_item_ms'] = {f'p{p}': float(np.percentile(item_times, p)) for p in (50, 90, 99)}
+    print(f"  {name:<24} {wall_time:9.3f} s  {peak / 2**20:9.1f} MB  ({len(item_times)} items)")
+    return results, measurement
+
+
+# Write a synthetic corpus with scale copies of every recording to directory. Returns the list of files
+
+def make_corpus(scale, directory):
+    files = sorted(Path(DIRECTORY).rglob('*.csv'))
+    if scale == 1:
+        return files
+    rng = np.random.default_rng(0)
+    corpus = []
+    for csv in files:
+        timestamps, channels = recordings.read_csv(csv)
+        activity_dir = Path(directory) / csv.parent.name
+        activity_dir.mkdir(parents=True, exist_ok=True)
+        for copy in range(scale):
+            copy_path = activity_dir / f'{csv.stem}-copy{copy}.csv'
+            noisy = channels + rng.normal(0, NOISE, channels.shape)
+            recordings.save_recording(copy_path, timestamps, noisy)
+            # Only the csv files are benchmarked, remove the binary copy
+            for path in recordings.get_binary_paths(copy_path):
+                path.unlink()
+            corpus.append(copy_path)
+    return corpus
+
+
+def benchmark_corpus(recognizer, files):
+    measurements = []
+    params = recognizer.get_feature_params()
+
+    loaded, measurement = run_stage('csv_load', lambda csv: recordings.drop_missing(recordings.read_csv(csv)[1]), files)
+    measurements.append(measurement)
+    filtered, measurement = run_stage('apply_filter', recognizer.apply_filter, loaded)
+    measurements.append(measurement)
+    _, measurement = run_stage('get_dominant_frequency', recognizer.get_dominant_frequency, filtered)
+    measurements.append(measurement)
+    samples, measurement = run_stage('extract_features', recognizer.extract_window_features, loaded)
+    measurements.append(measurement)
+    _, measurement = run_stage('featurize_files_parallel', lambda file_list: recordings.featurize_files(file_list, params), [files])
+    measurements.append(measurement)
+
+    classes = np.repeat([LABEL_DICT[csv.parent.name] for csv in files], [len(file_samples) for file_samples in samples])
+    samples = np.concatenate(samples)
+    scalers, measurement = run_stage('scaler_fit', lambda x: StandardScaler().fit(x), [samples])
+    measurements.append(measurement)
+    recognizer.scaler = scalers[0]
+    scaled = recognizer.scaler.transform(samples)
+    fitted, measurement = run_stage('classifier_fit', lambda x: recognizer.create_classifier().fit(x, classes), [scaled])
+    measurements.append(measurement)
+    recognizer.classifier = fitted[0]
+
+    # Batch prediction runs on whole recordings (filtered as in training), as many as give BATCH_WINDOWS windows
+    window_counts = np.cumsum([max(0, (len(data) - recognizer.window_size) // WINDOW_STRIDE + 1) for data in loaded])
+    batch_recordings = loaded[:int(np.searchsorted(window_counts, BATCH_WINDOWS)) + 1]
+    predictions, measurement = run_stage('predict_batch', lambda data: recognizer.predict_batch(data, WINDOW_STRIDE), [batch_recordings])
+    measurement['windows'] = len(predictions[0])
+    measurement['per_window_ms'] = measurement['wall_s'] * 1000 / len(predictions[0])
+    measurements.append(measurement)
+    # Single prediction classifies the features of one window at a time, taken evenly from the training windows
+    single_features = samples[np.linspace(0, len(samples) - 1, min(SINGLE_WINDOWS, len(samples))).astype(int)]
+    _, measurement = run_stage('predict_single', recognizer.classify, single_features)
+    measurements.append(measurement)
+
+    # Live prediction: one sample is pushed into the incremental window, then the window is classified
+    live_window = features.SlidingWindowFeatures(recognizer.window_size, recognizer.butter_filter, recognizer.sampling_rate)
+    for sample in loaded[0][:recognizer.window_size]:
+        live_window.push(sample)
+    live_samples = np.concatenate(loaded)[:LIVE_SAMPLES]
+    def predict_live(sample):
+        live_window.push(sample)
+        return recognizer.classify(live_window.get_features())
+    _, measurement = run_stage('predict_live_data', predict_live, live_samples)
+    measurements.append(measurement)
+    return measurements
+
+
+def get_git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+# Print the change of every stage compared to an earlier result file. Stages that are measured per item are
+# compared by their median time per item (the number of items may differ), all others by their wall time
+
+def get_time(measurement):
+    if 'per_item_ms' in measurement:
+        return measurement['per_item_ms']['p50'] / 1000
+    return measurement['wall_s']
+
+def compare(results, previous_path):
+    with open(previous_path) as f:
+        previous = json.load(f)
+    previous_times = {(run['scale'], m['stage']): get_time(m) for run in previous['runs'] for m in run['stages']}
+    print(f"\nCompared to {previous_path}:")
+    for run in results['runs']:
+        for measurement in run['stages']:
+            before = previous_times.get((run['scale'], measurement['stage']))
+            if before:
+                after = get_time(measurement)
+                print(f"  {run['scale']:>4}x {measurement['stage']:<24} {before * 1000:10.3f} ms -> {after * 1000:10.3f} ms ({after / before:.2f}x)")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark the training and prediction stages of the recognizer')
+    parser.add_argument('--scales', type=int, nargs='+', default=[1, 10, 100], help='corpus sizes as multiples of data/')
+    parser.add_argument('--output', help=f'result file (default: {RESULTS_DIR}benchmark-<time>.json)')
+    parser.add_argument('--compare', help='earlier result file to compare with')
+    parser.add_argument('--classifier', help=f"classifier to benchmark ({', '.join(classifiers.CLASSIFIERS)}, default: the recognizer's)")
+    args = parser.parse_args()
+
+    recognizer = Recognizer(listen=False)
+    if args.classifier:
+        recognizer.set_params({'classifier': args.classifier})
+    results = {
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'commit': get_git_commit(),
+        'python': sys.version.split()[0],
+        'numpy': np.__version__,
+        'platform': platform.platform(),
+        'classifier': recognizer.classifier_name,
+        'cpu_count': os.cpu_count(),
+        'runs': [],
+    }
+    for scale in args.scales:
+        directory = tempfile.mkdtemp(prefix='benchmark-')
+        try:
+            files = make_corpus(scale, directory)
+            print(f"Corpus {scale}x ({len(files)} recordings)")
+            results['runs'].append({'scale': scale, 'files': len(files), 'stages': benchmark_corpus(recognizer, files)})
+        finally:
+            shutil.rmtree(directory)
+
+    output = args.output or f"{RESULTS_DIR}benchmark-{time.strftime('%Y%m%d-%H%M%S')}.json"
+    Path(output).parent.mkdir(parents=True, exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"Results written to {output}")
+
+    if args.compare:
+        compare(results, args.compare)
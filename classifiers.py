@@ -0,0 +1,123 @@
+import time
+import pickle
+import argparse
+import numpy as np
+
+# The classifiers the recognizer can use. Every classifier provides calibrated probabilities (predict_proba),
+# which are used as the confidence of a prediction.
+# svc:      SVC with a polynomial kernel. SVC is one-vs-one already, but its prediction time grows with the number
+#           of support vectors and so with the size of the training data
+# linear:   linear SVM. Prediction is one matrix product, independent of the size of the training data
+# nystroem: linear SVM on a Nyström approximation of an RBF kernel with a fixed number of components
+# forest:   ensemble of extremely randomized trees with a limited depth
+# scikit-learn is imported by the functions that need it, so that the names can be used without importing it
+CLASSIFIERS = ['svc', 'linear', 'nystroem', 'forest']
+# With cross-validation grouped by participant and the default filter and window parameters, forest is the most
+# accurate (77%, nystroem 75%, linear and svc 70%) at about 7 ms per window (py classifiers.py --default-params)
+DEFAULT_CLASSIFIER = 'forest'
+
+CALIBRATION_FOLDS = 3   # Cross-validation folds used to fit the probability calibration
+NYSTROEM_COMPONENTS = 100
+FOREST_TREES = 50
+FOREST_DEPTH = 12
+LATENCY_REPEATS = 200   # Number of single windows timed per classifier in compare_classifiers
+
+
+# Create an untrained classifier by its name (see CLASSIFIERS)
+
+def make_classifier(name=DEFAULT_CLASSIFIER, seed=0):
+    from sklearn import svm
+    from sklearn.calibration import CalibratedClassifierCV
+    from sklearn.ensemble import ExtraTreesClassifier
+    from sklearn.kernel_approximation import Nystroem
+    from sklearn.pipeline import make_pipeline
+    if name == 'svc':
+        estimator = svm.SVC(kernel='poly', random_state=seed)
+    elif name == 'linear':
+        estimator = svm.LinearSVC(dual='auto', random_state=seed)
+    elif name == 'nystroem':
+        estimator = make_pipeline(Nystroem(n_components=NYSTROEM_COMPONENTS, random_state=seed),
+                                  svm.LinearSVC(dual='auto', random_state=seed))
+    elif name == 'forest':
+        estimator = ExtraTreesClassifier(n_estimators=FOREST_TREES, max_depth=FOREST_DEPTH, random_state=seed)
+    else:
+        raise ValueError(f"Unknown classifier '{name}', expected one of {CLASSIFIERS}")
+    # With ensemble=False the estimator is fitted once on all data and only the calibration is cross-validated,
+    # so prediction costs a single estimator
+    return CalibratedClassifierCV(estimator, method='sigmoid', cv=CALIBRATION_FOLDS, ensemble=False)
+
+
+# Cross-validate every classifier on the same folds and measure its accuracy, the time to fit it, the latency of
+# predicting a single window and the size of the pickled model. Returns a list of dicts. If groups (e.g. the
+# participant of every sample) are given, no group is in the training and the test data of the same fold, otherwise
+# windows of the same recording would end up on both sides and make the accuracy look too good.
+# The scaler is fitted on the training data of every fold, samples are the unscaled features
+
+def compare_classifiers(samples, classes, names=CLASSIFIERS, folds=5, seed=0, groups=None):
+    from sklearn import model_selection, metrics
+    from sklearn.preprocessing import StandardScaler
+    if groups is None:
+        splitter = model_selection.StratifiedKFold(n_splits=folds, shuffle=True, random_state=seed)
+    else:
+        splitter = model_selection.GroupKFold(n_splits=min(folds, len(set(groups))))
+    fold_indices = list(splitter.split(samples, classes, groups))
+
+    results = []
+    for name in names:
+        accuracies = []
+        confidences = []
+        fit_time = 0
+        for train_index, test_index in fold_indices:
+            scaler = StandardScaler().fit(samples[train_index])
+            classifier = make_classifier(name, seed)
+            start_time = time.perf_counter()
+            classifier.fit(scaler.transform(samples[train_index]), classes[train_index])
+            fit_time += time.perf_counter() - start_time
+
+            probabilities = classifier.predict_proba(scaler.transform(samples[test_index]))
+            pred = classifier.classes_[np.argmax(probabilities, axis=1)]
+            accuracies.append(metrics.accuracy_score(classes[test_index], pred))
+            confidences.append(probabilities.max(axis=1).mean())
+
+        # Latency and size are measured with the classifier of the last fold
+        test_samples = scaler.transform(samples[test_index])
+        latencies = []
+        for window in test_samples[np.arange(LATENCY_REPEATS) % len(test_samples)]:
+            window_start = time.perf_counter()
+            classifier.predict_proba(window.reshape(1, -1))
+            latencies.append(time.perf_counter() - window_start)
+        latencies = np.array(latencies) * 1000
+
+        results.append({
+            'classifier': name,
+            'accuracy': float(np.mean(accuracies)),
+            'accuracy_std': float(np.std(accuracies)),
+            'mean_confidence': float(np.mean(confidences)),
+            'fit_s': fit_time / len(fold_indices),
+            'latency_ms': {f'p{p}': float(np.percentile(latencies, p)) for p in (50, 90, 99)},
+            'size_kb': len(pickle.dumps(classifier)) / 1024,
+        })
+    return results
+
+
+def print_comparison(results):
+    print(f"{'classifier':<10} {'accuracy':>9} {'std':>6} {'confidence':>11} {'fit s':>8} {'p50 ms':>8} {'p99 ms':>8} {'size KB':>9}")
+    for result in results:
+        print(f"{result['classifier']:<10} {result['accuracy']:>9.2%} {result['accuracy_std']:>6.2%} {result['mean_confidence']:>11.2f} {result['fit_s']:>8.3f} "
+              f"{result['latency_ms']['p50']:>8.3f} {result['latency_ms']['p99']:>8.3f} {result['size_kb']:>9.1f}")
+
+
+if __name__ == '__main__':
+    from activity_recognizer import Recognizer
+
+    parser = argparse.ArgumentParser(description='Compare the classifiers on the training data')
+    parser.add_argument('names', nargs='*', default=CLASSIFIERS, help=f"classifiers to compare (default: all of {', '.join(CLASSIFIERS)})")
+    parser.add_argument('--folds', type=int, default=5, help='number of cross-validation folds (grouped by participant)')
+    parser.add_argument('--seed', type=int, default=0, help='seed of the classifiers')
+    parser.add_argument('--default-params', action='store_true', help='use the default filter and window parameters instead of the ones found by training.py')
+    args = parser.parse_args()
+
+    recognizer = Recognizer(listen=False, saved_params=not args.default_params)
+    samples, classes, groups, _ = recognizer.load_training_data(recognizer.get_training_files())
+    print(f"{len(samples)} windows, {len(set(classes))} classes, {len(set(groups))} participants")
+    print_comparison(compare_classifiers(samples, classes, args.names, args.folds, args.seed, groups))
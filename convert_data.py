@@ -0,0 +1,17 @@
+from pathlib import Path
+import sys
+from recordings import convert_recording
+from utils import DIRECTORY
+
+# Create binary copies (.channels.npy / .timestamps.npy) of all csv recordings in DIRECTORY, so that
+# training and resampling can memory-map them instead of parsing the csv files.
+# Recordings with an up to date binary copy are skipped unless --force is passed
+
+force = '--force' in sys.argv
+converted = 0
+files = sorted(Path(DIRECTORY).rglob('*.csv'))
+for csv in files:
+    if convert_recording(csv, force=force):
+        converted += 1
+
+print(f"Converted {converted} of {len(files)} recordings.")
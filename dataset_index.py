@@ -0,0 +1,204 @@
+import os
+import json
+import hashlib
+import argparse
+from pathlib import Path
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import recordings
+from utils import DIRECTORY, DATASET_INDEX_PATH, LABEL_DICT
+
+# Keeps a manifest of all recordings in data/ with what training needs to know about them: participant,
+# activity (from the directory, as used for the labels, and from the file name, which doesn't always agree),
+# number of rows, duration, effective sampling rate, ratio of rows with missing values and the sha256 of the
+# file to find duplicates. Like the feature cache, an entry is only computed again if the size or the
+# modification time of its file changed, so updating the index of an unchanged data/ only needs a stat per file.
+# The Recognizer gets its training files from select_files instead of taking every csv file
+
+INDEX_VERSION = 1
+MAX_NAN_RATIO = 0.1     # Recordings with more rows with missing values are not used for training
+MIN_DURATION = 2.0      # Shorter recordings (in seconds) are not used for training
+HASH_BLOCK_SIZE = 2**20
+
+
+def hash_file(csv):
+    sha256 = hashlib.sha256()
+    with open(csv, 'rb') as f:
+        for block in iter(lambda: f.read(HASH_BLOCK_SIZE), b''):
+            sha256.update(block)
+    return sha256.hexdigest()
+
+
+# Compute the manifest entry of a recording. Only takes plain arguments so it can run in a worker
+
+def index_file(csv):
+    stat = os.stat(csv)
+    timestamps, channels = recordings.load_recording(csv)
+    timestamps = recordings.timestamps_in_seconds(timestamps)
+    channels = np.asarray(channels)
+    missing = int(np.isnan(channels).any(axis=1).sum()) if len(channels) else 0
+    duration = float(timestamps[-1] - timestamps[0]) if len(timestamps) > 1 else 0.0
+    name_parts = Path(csv).stem.split('-')
+    return {
+        'stat': [stat.st_size, stat.st_mtime_ns],
+        'participant': recordings.get_participant(csv),
+        'activity': recordings.get_activity(csv),
+        'name_activity': name_parts[1] if len(name_parts) > 1 else None,
+        'rows': len(channels),
+        'duration_s': duration,
+        # Rows with values per second, gaps (missing rows or rows with missing values) lower the rate
+        'sample_rate': (len(channels) - missing) / duration if duration > 0 else 0.0,
+        'nan_ratio': missing / len(channels) if len(channels) else 1.0,
+        'sha256': hash_file(csv),
+    }
+
+
+class DatasetIndex:
+
+    def __init__(self, path=DATASET_INDEX_PATH):
+        self.path = Path(path)
+        self.entries = {}   # {file: entry (see index_file)}
+        self.changed = False
+        if self.path.exists():
+            try:
+                with open(self.path) as f:
+                    index = json.load(f)
+                if index.get('version') == INDEX_VERSION:
+                    self.entries = index['entries']
+            except (OSError, ValueError) as e:
+                print(f"Could not load dataset index: {e}")
+
+    # Bring the index up to date with the csv files in directory: new and changed files are indexed (in parallel),
+    # entries of deleted files are removed. Returns the files that were indexed
+
+    def update(self, directory=DIRECTORY, workers=None):
+        files = [csv.as_posix() for csv in sorted(Path(directory).rglob('*.csv'))]
+        changed = []
+        for csv in files:
+            stat = os.stat(csv)
+            entry = self.entries.get(csv)
+            if entry is None or entry['stat'] != [stat.st_size, stat.st_mtime_ns]:
+                changed.append(csv)
+        if changed:
+            # Loading the binary copies and hashing release the GIL, so threads are enough
+            with ThreadPoolExecutor(max_workers=workers or os.cpu_count() or 1) as executor:
+                for csv, entry in zip(changed, executor.map(index_file, changed)):
+                    self.entries[csv] = entry
+            self.changed = True
+        # Only the files below directory are checked, entries of other directories are kept
+        root = Path(directory)
+        keep = set(files)
+        for csv in [csv for csv in self.entries if root in Path(csv).parents and csv not in keep]:
+            del self.entries[csv]
+            self.changed = True
+        return changed
+
+    # Get groups of files with the same content, every group sorted by path
+
+    def get_duplicates(self):
+        by_hash = {}
+        for csv, entry in sorted(self.entries.items()):
+            by_hash.setdefault(entry['sha256'], []).append(csv)
+        return [files for files in by_hash.values() if len(files) > 1]
+
+    # Get the reasons a recording doesn't match the criteria, an empty list if it does
+
+    def get_rejections(self, csv, participants=None, activities=None, max_nan_ratio=MAX_NAN_RATIO,
+                       min_duration=MIN_DURATION, min_sample_rate=None):
+        entry = self.entries[csv]
+        reasons = []
+        if entry['activity'] not in LABEL_DICT:
+            reasons.append(f"unknown activity '{entry['activity']}'")
+        if participants is not None and entry['participant'] not in participants:
+            reasons.append('participant not selected')
+        if activities is not None and entry['activity'] not in activities:
+            reasons.append('activity not selected')
+        if entry['nan_ratio'] > max_nan_ratio:
+            reasons.append(f"{entry['nan_ratio']:.0%} rows with missing values")
+        if entry['duration_s'] < min_duration:
+            reasons.append(f"only {entry['duration_s']:.1f} s long")
+        if min_sample_rate is not None and entry['sample_rate'] < min_sample_rate:
+            reasons.append(f"only {entry['sample_rate']:.0f} Hz")
+        return reasons
+
+    # Get the files below directory that match all criteria (see get_rejections), sorted by path. Of files with the
+    # same content, only the first one is selected
+
+    def select(self, directory=DIRECTORY, **criteria):
+        selected = []
+        hashes = set()
+        for csv in sorted(self.entries):
+            if Path(directory) not in Path(csv).parents:
+                continue
+            if not self.get_rejections(csv, **criteria) and self.entries[csv]['sha256'] not in hashes:
+                hashes.add(self.entries[csv]['sha256'])
+                selected.append(Path(csv))
+        return selected
+
+    def save(self):
+        if not self.changed:
+            return
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_name(self.path.name + '.tmp')
+        with open(tmp_path, 'w') as f:
+            json.dump({'version': INDEX_VERSION, 'entries': self.entries}, f)
+        os.replace(tmp_path, self.path)
+        self.changed = False
+
+
+# Update the index of directory and get the training files that match the criteria (see DatasetIndex.get_rejections)
+
+def select_files(directory=DIRECTORY, index_path=DATASET_INDEX_PATH, **criteria):
+    index = DatasetIndex(index_path)
+    index.update(directory)
+    index.save()
+    return index.select(directory, **criteria)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Index the recordings and show which ones are used for training')
+    parser.add_argument('--directory', default=DIRECTORY, help='directory with the recordings')
+    parser.add_argument('--participants', nargs='+', help='only use the recordings of these participants')
+    parser.add_argument('--activities', nargs='+', help='only use the recordings of these activities')
+    parser.add_argument('--max-nan-ratio', type=float, default=MAX_NAN_RATIO, help='highest ratio of rows with missing values')
+    parser.add_argument('--min-duration', type=float, default=MIN_DURATION, help='shortest duration in seconds')
+    parser.add_argument('--min-sample-rate', type=float, help='lowest effective sampling rate in Hz')
+    parser.add_argument('--rebuild', action='store_true', help='index every recording again')
+    args = parser.parse_args()
+
+    index = DatasetIndex()
+    if args.rebuild:
+        index.entries = {}
+    indexed = index.update(args.directory)
+    index.save()
+    print(f"{len(index.entries)} recordings in the index, {len(indexed)} (re)indexed")
+
+    criteria = {
+        'participants': args.participants,
+        'activities': args.activities,
+        'max_nan_ratio': args.max_nan_ratio,
+        'min_duration': args.min_duration,
+        'min_sample_rate': args.min_sample_rate,
+    }
+    entries = {csv: entry for csv, entry in index.entries.items() if Path(args.directory) in Path(csv).parents}
+    selected_files = {path.as_posix() for path in index.select(args.directory, **criteria)}
+    selected_by_hash = {index.entries[csv]['sha256']: csv for csv in sorted(selected_files, reverse=True)}
+    selected = Counter()
+    for csv, entry in sorted(entries.items()):
+        reasons = index.get_rejections(csv, **criteria)
+        if csv in selected_files:
+            selected[(entry['participant'], entry['activity'])] += 1
+        elif reasons:
+            print(f"  skipped {csv}: {', '.join(reasons)}")
+        else:
+            print(f"  skipped {csv}: duplicate of {selected_by_hash[entry['sha256']]}")
+        if entry['name_activity'] != entry['activity']:
+            print(f"  note: {csv} is named '{entry['name_activity']}' but labeled '{entry['activity']}' by its directory")
+
+    participants = sorted({participant for participant, _ in selected})
+    activities = sorted({activity for _, activity in selected})
+    print(f"\n{'participant':<12}" + ''.join(f'{activity:>12}' for activity in activities))
+    for participant in participants:
+        print(f"{participant:<12}" + ''.join(f'{selected[(participant, activity)]:>12}' for activity in activities))
+    print(f"{sum(selected.values())} of {len(entries)} recordings selected for training")
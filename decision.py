@@ -0,0 +1,69 @@
+import math
+import numpy as np
+
+# Turns the class probabilities of successive windows into a stable decision. Single windows are noisy, so the
+# probabilities are smoothed exponentially over time and the decision only switches to another activity once
+# its smoothed probability is higher than that of the current one by a margin (hysteresis).
+# Until the window is full for the first time, the classifier can still be asked about the samples it has so
+# far. Such partial windows are less reliable, so they only lead to a decision if the classifier is very sure
+
+SMOOTHING_TIME = 0.5        # Time constant of the exponential smoothing in seconds (0 disables smoothing)
+SWITCH_MARGIN = 0.2         # How much more probable another activity has to be to switch the decision
+EARLY_CONFIDENCE = 0.9      # Probability a partial window needs to make the first decision
+EARLY_MIN_SAMPLES = 25      # Number of samples a partial window needs to be classified at all
+
+
+class DecisionFilter:
+
+    def __init__(self, labels, smoothing_time=SMOOTHING_TIME, switch_margin=SWITCH_MARGIN,
+                 early_confidence=EARLY_CONFIDENCE, early_min_samples=EARLY_MIN_SAMPLES):
+        self.labels = labels    # Label of every class, in the order of the probabilities
+        self.smoothing_time = smoothing_time
+        self.switch_margin = switch_margin
+        self.early_confidence = early_confidence
+        self.early_min_samples = early_min_samples
+        self.reset()
+
+    def reset(self):
+        self.probabilities = None   # Smoothed probabilities, None until the first full window
+        self.last_time = None
+        self.decision = None        # Class index of the current decision
+        self.label = None
+        self.confidence = None
+        self.changes = 0            # Number of times the decision changed to another activity
+
+    def _decide(self, index, confidence):
+        if index != self.decision:
+            if self.decision is not None:
+                self.changes += 1
+            self.decision = index
+            self.label = self.labels[index]
+        self.confidence = float(confidence)
+
+    # Add the class probabilities of the latest window, classified at timestamp (in seconds). partial marks a window
+    # that is not full yet. Returns the label of the current decision or None if there is none yet
+
+    def update(self, probabilities, timestamp, partial=False):
+        probabilities = np.asarray(probabilities, dtype=float)
+        if partial:
+            # Partial windows don't take part in the smoothing, they can only make the first decision
+            best = int(np.argmax(probabilities))
+            if self.probabilities is None and probabilities[best] >= self.early_confidence:
+                self._decide(best, probabilities[best])
+            return self.label
+
+        if self.probabilities is None or self.smoothing_time <= 0:
+            self.probabilities = probabilities.copy()
+        else:
+            # The weight of the new window depends on the time since the last one, so the smoothing behaves the
+            # same no matter how often windows are classified
+            alpha = 1 - math.exp(-max(timestamp - self.last_time, 0) / self.smoothing_time)
+            self.probabilities += alpha * (probabilities - self.probabilities)
+        self.last_time = timestamp
+
+        best = int(np.argmax(self.probabilities))
+        if self.decision is None or self.probabilities[best] >= self.probabilities[self.decision] + self.switch_margin:
+            self._decide(best, self.probabilities[best])
+        else:
+            self.confidence = float(self.probabilities[self.decision])
+        return self.label
@@ -0,0 +1,280 @@
+import sys
+import json
+import time
+import argparse
+import tempfile
+import subprocess
+from pathlib import Path
+import numpy as np
+from sklearn import svm
+from sklearn.ensemble import ExtraTreesClassifier, RandomForestClassifier
+from sklearn.pipeline import Pipeline
+import features
+import model_store
+import recordings
+import runtime
+from activity_recognizer import Recognizer, CLASS_LABELS
+from benchmark import RESULTS_DIR
+from utils import MODEL_PATH, RUNTIME_PATH
+
+# Compiles the trained recognizer into the numpy-only format of runtime.py. Arrays are stored as float32. The
+# arrays listed in QUANTIZABLE are tried as int8 one after another, each is kept as int8 if at least
+# MIN_AGREEMENT of the windows in data/ are still predicted the same as with scikit-learn and no probability
+# changes by more than MAX_PROBABILITY_DIFF (the decision layer relies on the probabilities, too).
+# Afterwards the compiled model is checked against the scikit-learn path on all recordings in data/ (with its own
+# filter implementation) and both are compared by import time, memory and latency, each in a fresh process
+
+MIN_AGREEMENT = 0.999
+MAX_PROBABILITY_DIFF = 0.05
+QUANTIZABLE = {
+    'linear': ['coef'],
+    'nystroem': ['components', 'normalization', 'coef'],
+    'svc': ['support_vectors', 'dual_coef'],
+    'forest': ['value'],
+}
+LATENCY_WINDOWS = 500   # Number of windows classified one by one to measure the latency
+
+
+# Get the arrays of the fitted scaler and classifier (a CalibratedClassifierCV with ensemble=False, as made
+# by classifiers.make_classifier). Returns the type of the classifier (a key of runtime.CLASSIFIER_TYPES) and the arrays
+
+def compile_model(scaler, classifier):
+    if len(getattr(classifier, 'calibrated_classifiers_', [])) != 1:
+        raise ValueError("Only classifiers made by classifiers.make_classifier can be exported")
+    calibrated = classifier.calibrated_classifiers_[0]
+    estimator = calibrated.estimator
+    arrays = {
+        'scaler_mean': scaler.mean_.astype(np.float32),
+        'scaler_scale': scaler.scale_.astype(np.float32),
+        'classes': classifier.classes_,
+        'calibration_a': np.array([calibrator.a_ for calibrator in calibrated.calibrators], dtype=np.float32),
+        'calibration_b': np.array([calibrator.b_ for calibrator in calibrated.calibrators], dtype=np.float32),
+    }
+
+    if isinstance(estimator, Pipeline):
+        nystroem, linear = estimator.named_steps['nystroem'], estimator.named_steps['linearsvc']
+        gamma = nystroem.gamma if nystroem.gamma is not None else 1 / nystroem.components_.shape[1]
+        arrays.update({
+            'components': nystroem.components_.astype(np.float32),
+            'normalization': nystroem.normalization_.astype(np.float32),
+            'gamma': np.float32(gamma),
+            'coef': linear.coef_.astype(np.float32),
+            'intercept': linear.intercept_.astype(np.float32),
+        })
+        return 'nystroem', arrays
+
+    if isinstance(estimator, svm.LinearSVC):
+        arrays.update({'coef': estimator.coef_.astype(np.float32), 'intercept': estimator.intercept_.astype(np.float32)})
+        return 'linear', arrays
+
+    if isinstance(estimator, svm.SVC):
+        if estimator.kernel != 'poly':
+            raise ValueError(f"SVC with a {estimator.kernel} kernel can't be exported")
+        arrays.update({
+            'support_vectors': estimator.support_vectors_.astype(np.float32),
+            'dual_coef': estimator.dual_coef_.astype(np.float32),
+            'intercept': estimator.intercept_.astype(np.float32),
+            'n_support': estimator.n_support_.astype(np.int32),
+            'kernel_params': np.array([estimator._gamma, estimator.coef0, estimator.degree], dtype=np.float32),
+        })
+        return 'svc', arrays
+
+    if isinstance(estimator, (ExtraTreesClassifier, RandomForestClassifier)):
+        trees = [tree.tree_ for tree in estimator.estimators_]
+        offsets = np.cumsum([0] + [tree.node_count for tree in trees[:-1]])
+        left, right, feature, threshold, value = [], [], [], [], []
+        for offset, tree in zip(offsets, trees):
+            nodes = np.arange(tree.node_count)
+            leaf = tree.children_left == -1
+            # Leaves point to themselves and compare any feature with any threshold
+            left.append(np.where(leaf, nodes, tree.children_left) + offset)
+            right.append(np.where(leaf, nodes, tree.children_right) + offset)
+            feature.append(np.where(leaf, 0, tree.feature))
+            threshold.append(np.where(leaf, 0, tree.threshold))
+            tree_value = tree.value[:, 0, :]
+            value.append(tree_value / np.maximum(tree_value.sum(axis=1, keepdims=True), np.finfo(float).tiny))
+        index_type = np.int32 if offsets[-1] + trees[-1].node_count > np.iinfo(np.int16).max else np.int16
+        arrays.update({
+            'roots': offsets.astype(index_type),
+            'left': np.concatenate(left).astype(index_type),
+            'right': np.concatenate(right).astype(index_type),
+            'feature': np.concatenate(feature).astype(np.int8 if len(scaler.mean_) <= 127 else np.int16),
+            'threshold': np.concatenate(threshold).astype(np.float32),
+            'value': np.concatenate(value).astype(np.float32),
+            'max_depth': np.int32(max(tree.max_depth for tree in trees)),
+        })
+        return 'forest', arrays
+
+    raise ValueError(f"{type(estimator).__name__} can't be exported")
+
+
+# Build the runtime classifier from arrays, with the arrays in quantized going through int8 and back
+
+def build_classifier(name, arrays, quantized=()):
+    arrays = {key: runtime.dequantize(*runtime.quantize(array)) if key in quantized else array for key, array in arrays.items()}
+    return runtime.CLASSIFIER_TYPES[name](arrays)
+
+
+# Export the recognizer's trained model to path. samples are feature vectors used to decide which arrays can be
+# stored as int8. Returns the type of the classifier and the names of the quantized arrays
+
+def export(recognizer, path, fingerprint, samples, quantize=True):
+    name, arrays = compile_model(recognizer.scaler, recognizer.classifier)
+    reference = recognizer.classifier.predict_proba(recognizer.scale(samples))
+    scaled = runtime.Scaler(arrays['scaler_mean'], arrays['scaler_scale']).transform(samples)
+
+    quantized = []
+    if quantize:
+        for array_name in QUANTIZABLE[name]:
+            candidate = quantized + [array_name]
+            proba = build_classifier(name, arrays, candidate).predict_proba(scaled)
+            agreement = np.mean(np.argmax(proba, axis=1) == np.argmax(reference, axis=1))
+            if agreement >= MIN_AGREEMENT and np.abs(proba - reference).max() <= MAX_PROBABILITY_DIFF:
+                quantized = candidate
+
+    meta = {
+        'classifier': name,
+        'fingerprint': fingerprint,
+        'sos': recognizer.butter_filter.tolist(),
+        'order': recognizer.order,
+        'cutoff_frequency': recognizer.cutoff_frequency,
+        'sampling_rate': recognizer.sampling_rate,
+        'window_size': recognizer.window_size,
+        'labels': list(CLASS_LABELS),
+        'features': features.FEATURE_NAMES,
+    }
+    Path(path).parent.mkdir(parents=True, exist_ok=True)
+    runtime.save_model(path, meta, arrays, quantized)
+    return name, quantized
+
+
+# Compare both paths on all recordings in data/: the scikit-learn path filters with scipy, the runtime with its
+# own filter. Returns the share of windows predicted the same and the largest differences
+
+def check_parity(recognizer, runtime_recognizer, files):
+    same = 0
+    windows = 0
+    max_feature_diff = 0
+    max_proba_diff = 0
+    for csv in files:
+        _, channels = recordings.load_recording(csv)
+        data = recordings.drop_missing(channels)
+        reference_features = recognizer.extract_window_features(data)
+        runtime_features = runtime_recognizer.window_features(data, recognizer.window_stride)
+        if not len(reference_features):
+            continue
+        reference_proba = recognizer.predict_scores(recognizer.scale(reference_features))
+        runtime_proba = runtime_recognizer.classifier.predict_proba(runtime_recognizer.scaler.transform(runtime_features))
+        same += np.sum(np.argmax(reference_proba, axis=1) == np.argmax(runtime_proba, axis=1))
+        windows += len(reference_features)
+        max_feature_diff = max(max_feature_diff, float(np.abs(reference_features - runtime_features).max()))
+        max_proba_diff = max(max_proba_diff, float(np.abs(reference_proba - runtime_proba).max()))
+    return {
+        'windows': windows,
+        'agreement': same / windows if windows else None,
+        'max_feature_diff': max_feature_diff,
+        'max_probability_diff': max_proba_diff,
+    }
+
+
+# Script that runs in a fresh process for each path: import what the path needs, load the model and classify the
+# windows one by one. Prints the measurements as json
+MEASURE_SCRIPT = """
+import sys, json, time
+start_time = time.perf_counter()
+{imports}
+import_time = time.perf_counter() - start_time
+load_start = time.perf_counter()
+{load}
+load_time = time.perf_counter() - load_start
+samples = np.load(sys.argv[1])
+latencies = []
+for sample in samples:
+    sample_start = time.perf_counter()
+    classifier.predict_proba(scaler.transform(sample.reshape(1, -1)))
+    latencies.append(time.perf_counter() - sample_start)
+latencies = np.array(latencies) * 1000
+try:
+    # On Linux ru_maxrss includes the parent process this one was forked from, VmHWM doesn't
+    with open('/proc/self/status') as f:
+        peak_rss = next(int(line.split()[1]) for line in f if line.startswith('VmHWM')) / 2**10
+except OSError:
+    try:
+        import resource
+        # ru_maxrss is in bytes on macOS
+        peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 2**20
+    except ImportError:
+        peak_rss = None
+print(json.dumps({{
+    'import_s': import_time,
+    'load_s': load_time,
+    'peak_rss_mb': peak_rss,
+    'latency_ms': {{f'p{{p}}': float(np.percentile(latencies, p)) for p in (50, 90, 99)}},
+    'modules': len(sys.modules),
+}}))
+"""
+PATHS = {
+    'sklearn': {
+        'imports': 'import numpy as np\nimport joblib\nfrom scipy import signal',
+        'load': f"model = joblib.load('{MODEL_PATH}')\nscaler, classifier = model['scaler'], model['classifier']",
+    },
+    'runtime': {
+        'imports': 'import numpy as np\nimport runtime',
+        'load': f"_, scaler, classifier = runtime.load_model('{RUNTIME_PATH}')",
+    },
+}
+
+
+def compare_paths(samples):
+    with tempfile.TemporaryDirectory() as directory:
+        samples_path = Path(directory) / 'samples.npy'
+        np.save(samples_path, samples[np.linspace(0, len(samples) - 1, min(LATENCY_WINDOWS, len(samples))).astype(int)])
+        results = {}
+        for path_name, path in PATHS.items():
+            script = MEASURE_SCRIPT.format(**path)
+            output = subprocess.run([sys.executable, '-c', script, str(samples_path)], capture_output=True, text=True, check=True).stdout
+            results[path_name] = json.loads(output.strip().splitlines()[-1])
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Compile the trained recognizer for the numpy-only runtime and compare both')
+    parser.add_argument('--output', default=RUNTIME_PATH, help='file the compiled model is written to')
+    parser.add_argument('--no-quantize', action='store_true', help='store all arrays as float32')
+    args = parser.parse_args()
+
+    recognizer = Recognizer(listen=False)
+    # The scikit-learn model is compiled, not an earlier compiled one
+    recognizer.use_runtime = False
+    recognizer.load_or_train_classifier()
+    files = recognizer.get_training_files()
+    fingerprint = model_store.get_fingerprint(files, recognizer.get_model_params())
+    samples = recognizer.load_training_data(files).samples
+
+    name, quantized = export(recognizer, args.output, fingerprint, samples, not args.no_quantize)
+    print(f"Exported {name} classifier to {args.output} ({Path(args.output).stat().st_size / 1024:.1f} KB, "
+          f"sklearn model {Path(MODEL_PATH).stat().st_size / 1024:.1f} KB), int8: {', '.join(quantized) or 'none'}")
+
+    results = {
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'classifier': name,
+        'quantized': quantized,
+        'runtime_kb': Path(args.output).stat().st_size / 1024,
+        'sklearn_kb': Path(MODEL_PATH).stat().st_size / 1024,
+        'parity': check_parity(recognizer, runtime.RuntimeRecognizer(args.output), files),
+    }
+    print(f"Parity on {results['parity']['windows']} windows: {results['parity']['agreement']:.4%} same predictions, "
+          f"max probability difference {results['parity']['max_probability_diff']:.2g}")
+
+    results.update(compare_paths(samples))
+    for path_name in PATHS:
+        measurement = results[path_name]
+        print(f"  {path_name:<8} import {measurement['import_s'] * 1000:7.1f} ms  load {measurement['load_s'] * 1000:7.1f} ms  "
+              f"peak RSS {measurement['peak_rss_mb'] or 0:7.1f} MB  latency p50 {measurement['latency_ms']['p50']:.3f} ms  "
+              f"({measurement['modules']} modules)")
+
+    output = f"{RESULTS_DIR}runtime-{time.strftime('%Y%m%d-%H%M%S')}.json"
+    Path(output).parent.mkdir(parents=True, exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"Results written to {output}")
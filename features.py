@@ -0,0 +1,187 @@
+import numpy as np
+from collections import deque
+from utils import CHANNELS
+
+# Statistics computed for every channel, in the order they appear in the feature vector
+STATISTICS = ['max', 'min', 'mean', 'dominant_freq', 'std', 'var']
+FEATURE_NAMES = [f'{stat}_{channel}' for channel in CHANNELS for stat in STATISTICS]
+NUM_FEATURES = len(FEATURE_NAMES)
+
+
+# Create the Butterworth low-pass filter as second-order sections. scipy is only imported when it's needed,
+# so that the features can be computed without it (see runtime.py)
+
+def make_filter(order, cutoff_frequency, sampling_rate):
+    from scipy import signal
+    return signal.butter(order, cutoff_frequency, btype="low", analog=False, output="sos", fs=sampling_rate)
+
+
+# Filter all channels at once. data has the shape (..., N, channels)
+
+def apply_filter(data, sos):
+    from scipy import signal
+    return signal.sosfilt(sos, data, axis=-2)
+
+
+# Get the dominant frequency of every channel. Only the non-negative frequencies of the full FFT are
+# considered, so the Nyquist bin of an even-length window is skipped just like with np.fft.fftfreq
+
+def dominant_frequencies(filtered, sampling_rate):
+    n = filtered.shape[-2]
+    spectrum = np.abs(np.fft.rfft(filtered, axis=-2))[..., :(n - 1) // 2 + 1, :]
+    return np.argmax(spectrum, axis=-2) * (sampling_rate / n)
+
+
+# Compute the features of already filtered data. Returns an array of the shape (..., NUM_FEATURES)
+
+def compute_features(filtered, sampling_rate):
+    stats = np.stack([
+        filtered.max(axis=-2),
+        filtered.min(axis=-2),
+        filtered.mean(axis=-2),
+        dominant_frequencies(filtered, sampling_rate),
+        filtered.std(axis=-2, ddof=1),
+        filtered.var(axis=-2, ddof=1),
+    ], axis=-1)
+    # (..., channels, statistics) -> channel-major order as in FEATURE_NAMES
+    return stats.reshape(stats.shape[:-2] + (NUM_FEATURES,))
+
+
+# Filter the raw sensor data of shape (..., N, 6) and get its feature vector
+
+def extract_features(data, sos, sampling_rate):
+    data = np.asarray(data, dtype=float)
+    return compute_features(apply_filter(data, sos), sampling_rate)
+
+
+# Filter a whole recording of shape (N, 6) and get the features of its windows of `size` samples, starting every
+# `stride` samples. The recording is filtered once, like the live data that streams through the filter, and the
+# windows are views into the filtered data. Returns an array of the shape (W, NUM_FEATURES)
+
+def window_features(data, sos, sampling_rate, size, stride=1):
+    filtered = apply_filter(np.asarray(data, dtype=float), sos)
+    if len(filtered) < size:
+        return np.empty((0, NUM_FEATURES))
+    # (W, channels, size) -> (W, size, channels)
+    windows = np.lib.stride_tricks.sliding_window_view(filtered, size, axis=0)[::stride].transpose(0, 2, 1)
+    return compute_features(windows, sampling_rate)
+
+
+# Keeps the features of the last `size` samples up to date while samples stream in. The Butterworth filter
+# keeps its state between samples, mean/std/var come from running sums, min/max from monotonic deques and
+# the spectrum is updated with a sliding DFT. Every new sample costs O(1) per channel, except for the DFT
+# which updates one value per frequency bin
+
+class SlidingWindowFeatures:
+
+    def __init__(self, size, sos, sampling_rate, num_channels=len(CHANNELS)):
+        self.size = size
+        self.sampling_rate = sampling_rate
+        self.num_channels = num_channels
+        self.sos = np.asarray(sos, dtype=float)
+        # Only the non-negative frequencies of the full FFT are used (see dominant_frequencies)
+        self.num_bins = (size - 1) // 2 + 1
+        self.twiddle = np.exp(2j * np.pi * np.arange(self.num_bins) / size)[:, None]
+        self.reset()
+
+    def reset(self):
+        self.zi = np.zeros((self.sos.shape[0], 2, self.num_channels))
+        self.window = np.zeros((self.size, self.num_channels))  # Ring buffer of filtered samples
+        self.count = 0      # Number of samples pushed since the last reset
+        self.sum = np.zeros(self.num_channels)
+        self.sum_sq = np.zeros(self.num_channels)
+        self.spectrum = None
+        # Monotonic deques of (sample index, value) per channel. The front always holds the max/min
+        self.max_deques = [deque() for _ in range(self.num_channels)]
+        self.min_deques = [deque() for _ in range(self.num_channels)]
+
+    def is_full(self):
+        return self.count >= self.size
+
+    # Run one sample through the filter sections (direct form II transposed, same as sosfilt)
+
+    def filter_sample(self, sample):
+        x = np.asarray(sample, dtype=float)
+        for section, zi in zip(self.sos, self.zi):
+            b0, b1, b2, _, a1, a2 = section
+            y = b0 * x + zi[0]
+            zi[0] = b1 * x - a1 * y + zi[1]
+            zi[1] = b2 * x - a2 * y
+            x = y
+        return x
+
+    # Add one raw sample with one value per channel
+
+    def push(self, sample):
+        x = self.filter_sample(sample)
+        index = self.count % self.size
+        old = self.window[index].copy()
+        full = self.is_full()
+
+        self.window[index] = x
+        self.sum += x
+        self.sum_sq += x * x
+        if full:
+            self.sum -= old
+            self.sum_sq -= old * old
+            self.spectrum = (self.spectrum + (x - old)) * self.twiddle
+
+        for channel in range(self.num_channels):
+            value = x[channel]
+            max_deque = self.max_deques[channel]
+            while max_deque and max_deque[-1][1] <= value:
+                max_deque.pop()
+            max_deque.append((self.count, value))
+            if max_deque[0][0] <= self.count - self.size:
+                max_deque.popleft()
+
+            min_deque = self.min_deques[channel]
+            while min_deque and min_deque[-1][1] >= value:
+                min_deque.pop()
+            min_deque.append((self.count, value))
+            if min_deque[0][0] <= self.count - self.size:
+                min_deque.popleft()
+
+        self.count += 1
+        # Compute the sums and the spectrum exactly once the window is filled and then once per window
+        # length, so that floating point errors of the running updates can not pile up
+        if self.count % self.size == 0:
+            self.resync()
+
+    def ordered_window(self):
+        index = self.count % self.size
+        return np.concatenate((self.window[index:], self.window[:index]))
+
+    def resync(self):
+        window = self.ordered_window()
+        self.sum = window.sum(axis=0)
+        self.sum_sq = (window * window).sum(axis=0)
+        self.spectrum = np.fft.rfft(window, axis=0)[:self.num_bins]
+
+    # Get the feature vector of the samples pushed so far while the window is not full yet, computed from scratch.
+    # Returns None with less than two samples (std and var need two)
+
+    def get_partial_features(self):
+        if self.is_full():
+            return self.get_features()
+        if self.count < 2:
+            return None
+        return compute_features(self.window[:self.count], self.sampling_rate)
+
+    # Get the feature vector of the current window (in FEATURE_NAMES order)
+
+    def get_features(self):
+        if not self.is_full():
+            return None
+        n = self.size
+        mean = self.sum / n
+        var = np.maximum((self.sum_sq - self.sum * mean) / (n - 1), 0)
+        stats = np.stack([
+            [max_deque[0][1] for max_deque in self.max_deques],
+            [min_deque[0][1] for min_deque in self.min_deques],
+            mean,
+            np.argmax(np.abs(self.spectrum), axis=0) * (self.sampling_rate / n),
+            np.sqrt(var),
+            var,
+        ], axis=-1)
+        return stats.reshape(NUM_FEATURES)
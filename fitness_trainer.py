@@ -1,15 +1,22 @@
-from activity_recognizer import Recognizer
 import pyglet
 from pyglet import window, clock
 from random import shuffle
 import os
+import time
 import threading
+import instrumentation
+import DIPPID
+from instrumentation import metrics
 
 from utils import WINDOW_WIDTH, WINDOW_HEIGHT, ACTIVITIES, IMG_DIR, FONT_NAME, FONT_COLOR, ACTIVE_COLOR
 
 DURATION = 20      # How long one activity should be performed
 UPDATE_RATE = 0.1   # Rate at which the pyglet window is updated
 PREP_TIME = 5    # Time to prepare for the next activity (during cooldown)
+DEBUG_OVERLAY = False   # Show the debug overlay from the start (can be toggled with F3, F4 writes a trace file)
+OVERLAY_RATE = 0.5      # Rate at which the debug overlay is updated
+TRACE_DIR = 'traces/'
+PROFILE_STARTUP = os.environ.get('FITNESS_TRAINER_PROFILE_STARTUP')    # Exit after the first frame (see startup_profile.py)
 
 started = False         # Checks if workout has started
 finished = False        # Checks if workout has finished
@@ -22,55 +29,157 @@ activities = ACTIVITIES.copy()          # Make a copy of all available activitie
 shuffle(activities)
 current_activity = activities.pop()     
 user_activity = None                    # Predicted activity based on the sensor data
+activity_start = None                   # When the current activity started (after the cooldown)
 
-recognizer = Recognizer()   # The activity recognizer
+# The activity recognizer and the worker that predicts activities off the UI thread. Both are created in the
+# background once the window is shown (see on_start), until then they are None
+recognizer = None
+recognition_worker = None
+session_log = None  # Logs the predictions of every workout to SESSION_DIR (see session_log.py)
 win = window.Window(WINDOW_WIDTH, WINDOW_HEIGHT)
 pyglet.gl.glClearColor(0.902, 0.961, 1.0, 1.0)  # background color
 
-# The images for the activities
-img1 = pyglet.sprite.Sprite(pyglet.image.load(f'{IMG_DIR}{current_activity}_1.png'), x=200, y=100)
-img2 = pyglet.sprite.Sprite(pyglet.image.load(f'{IMG_DIR}{current_activity}_2.png'), x=400, y=100)
-img1.scale = 0.2
-img2.scale = 0.2
-
-
-# Train the classifier upon starting the application
+# Load the images for all activities once at startup and pack them into texture atlases
+texture_bin = pyglet.image.atlas.TextureBin()
+images = {}
+for activity in ACTIVITIES:
+    for i in (1, 2):
+        images[(activity, i)] = texture_bin.add(pyglet.image.load(f'{IMG_DIR}{activity}_{i}.png'))
+
+
+# Every screen is drawn from its own batch. Labels, shapes and sprites are created only once,
+# afterwards only the texts, colors and images that change are updated
+
+def make_label(text, font_size, y, batch, color=FONT_COLOR, group=None, x=WINDOW_WIDTH//2, anchor_y='center'):
+    return pyglet.text.Label(text, font_name=FONT_NAME, font_size=font_size, color=color, x=x, y=y, anchor_x='center', anchor_y=anchor_y, batch=batch, group=group)
+
+def make_sprites(batch, group=None):
+    sprites = (pyglet.sprite.Sprite(images[(current_activity, 1)], x=200, y=100, batch=batch, group=group),
+               pyglet.sprite.Sprite(images[(current_activity, 2)], x=400, y=100, batch=batch, group=group))
+    for sprite in sprites:
+        sprite.scale = 0.2
+    return sprites
+
+# Changing the text of a label lays it out again, so only do it if the text actually changed
+def set_text(label, text):
+    if label.text != text:
+        label.text = text
+
+def set_color(label, color):
+    if tuple(label.color) != tuple(color):
+        label.color = color
+
+start_batch = pyglet.graphics.Batch()
+start_labels = [
+    make_label('Welcome to FitnessTrainer!', 36, WINDOW_HEIGHT//2 + 40, start_batch),
+    make_label('Press any button to start your workout.', 20, WINDOW_HEIGHT//2 - 40, start_batch),
+    make_label('Follow the instructions once workout starts', 20, WINDOW_HEIGHT//2 - 120, start_batch),
+]
+
+loading_batch = pyglet.graphics.Batch()
+loading_labels = [
+    make_label('Preparing workout data...', 36, WINDOW_HEIGHT//2 + 40, loading_batch),
+    make_label('This might take a few moments', 15, WINDOW_HEIGHT//2 - 40, loading_batch),
+]
+
+# During the cooldown, the images of the next activity are shown behind a veil with the text on top
+cooldown_batch = pyglet.graphics.Batch()
+cooldown_images = make_sprites(cooldown_batch, pyglet.graphics.Group(order=0))
+veil = pyglet.shapes.Rectangle(x=0, y=0, width=WINDOW_WIDTH, height=WINDOW_HEIGHT, color=(100, 100, 100, 180), batch=cooldown_batch, group=pyglet.graphics.Group(order=1))
+cooldown_text_group = pyglet.graphics.Group(order=2)
+next_up_label = make_label('', 30, WINDOW_HEIGHT//2 + 40, cooldown_batch, color=(255, 255, 255), group=cooldown_text_group)
+cooldown_label = make_label('', 18, WINDOW_HEIGHT//2 - 40, cooldown_batch, color=(255, 255, 255), group=cooldown_text_group)
+
+active_batch = pyglet.graphics.Batch()
+activity_label = make_label('', 36, WINDOW_HEIGHT//2 + 80, active_batch)
+countdown_label = make_label('', 20, WINDOW_HEIGHT-20, active_batch, x=WINDOW_WIDTH-100, anchor_y='baseline')
+active_images = make_sprites(active_batch)
+
+end_batch = pyglet.graphics.Batch()
+end_title_label = make_label('You did it!', 36, WINDOW_HEIGHT//2 + 40, end_batch)
+end_score_label = make_label('', 20, WINDOW_HEIGHT//2 - 40, end_batch)
+
+# The debug overlay shows how fast data comes in, how long predictions take and how old the latest one is
+overlay_batch = pyglet.graphics.Batch()
+overlay_labels = [pyglet.text.Label('', font_name=FONT_NAME, font_size=10, color=(80, 80, 80, 255), x=10, y=WINDOW_HEIGHT - 20 - 15*i, batch=overlay_batch) for i in range(6)]
+show_overlay = False
+last_frame_time = None
+
+
+# Create the recognizer and load the saved classifier upon starting the application. It is only trained again if
+# the training data changed. The recognizer's modules (and scipy/scikit-learn if they are needed) are imported on
+# a background thread, so the window and the loading screen appear right away
+
+def load_recognizer():
+    global recognizer, recognition_worker, session_log
+    from activity_recognizer import Recognizer, RecognitionWorker, CLASS_LABELS
+    from decision import DecisionFilter
+    from session_log import SessionLog
+    new_recognizer = Recognizer()
+    session_log = SessionLog(CLASS_LABELS, params=new_recognizer.get_model_params())
+    for button in ('button_1', 'button_2', 'button_3'):
+        new_recognizer.sensor.register_callback(button, handle_btn_press)
+    # The decision filter smoothes the predictions, so the label doesn't flicker. The worker predicts every
+    # INFERENCE_INTERVAL seconds (see activity_recognizer.py), independent of UPDATE_RATE
+    recognition_worker = RecognitionWorker(new_recognizer, decision=DecisionFilter(CLASS_LABELS), session_log=session_log)
+    if show_overlay:
+        instrumentation.instrument_recognizer(new_recognizer)
+    recognizer = new_recognizer
+    recognition_worker.start()
+    recognizer.load_or_train_classifier()
 
 def on_start(dt):
-    threading.Thread(target=recognizer.train_classifier, daemon=True).start()
+    # The sensor is created on another thread, where DIPPID can't install its ctrl+c handler
+    DIPPID.install_interrupt_handler()
+    threading.Thread(target=load_recognizer, daemon=True).start()
 
 clock.schedule_once(on_start, 0)
 
 
-# Check if the incoming data from the DIPPID device matches the current activity
+# The recognizer is ready once it has a classifier and enough live data for a prediction
+
+def is_ready():
+    return recognizer is not None and recognizer.finished_training and recognizer.got_live_data
+
+
+# Check if the latest prediction of the recognition worker matches the current activity. The time from the start
+# of an activity until it is recognized for the first time is recorded as a metric
 
 def update(dt):
-    global recognizer, finished, user_activity, current_activity, score
-    if recognizer.finished_training and not finished:
-        pred = recognizer.predict_live_data()
+    global recognizer, finished, user_activity, current_activity, score, activity_start
+    if recognizer is not None and recognizer.finished_training and not finished:
+        pred = recognition_worker.get_latest()
+        user_activity = pred.label if pred else None
         if pred:
-            user_activity = pred
             if user_activity == current_activity:
                 score += dt
+                if activity_start is not None:
+                    metrics.record('decision.time_to_first_correct', time.monotonic() - activity_start)
+                    activity_start = None
             
             # For debugging: Print the predicted activity
-            # print(f"Predicted activity: {pred}")
+            # print(f"Predicted activity: {pred.label} ({pred.confidence:.0%})")
 
 
 # Count down to time the activity. Add a cooldown phase between activities
 
 def count_down(dt):
-    global countdown, cooldown, in_cooldown, current_activity, activities, finished, started
+    global countdown, cooldown, in_cooldown, current_activity, activities, finished, started, activity_start
     if in_cooldown:
         if cooldown > 0:
             cooldown -= dt
         else:
             in_cooldown = False
-    elif countdown > 0 and started and recognizer.finished_training and recognizer.got_live_data:
+            # Predict the new activity from new data only
+            recognition_worker.reset()
+            activity_start = time.monotonic()
+            session_log.target = current_activity
+    elif countdown > 0 and started and is_ready():
         countdown -= dt
 
     if countdown <= 0:
         # Check if there are still activities to do. If so, update the current activity. If not, end the workout
+        session_log.target = None
         if activities:
             cooldown = PREP_TIME
             in_cooldown = True
@@ -80,49 +189,91 @@ def count_down(dt):
         else:
             finished = True
             started = False
+            stop_session_log()
 
 clock.schedule_interval(update, UPDATE_RATE)
 clock.schedule_interval(count_down, UPDATE_RATE)
 
 
-# Update the sprites based on the current activity
+# Update the sprites based on the current activity. The images were already loaded at startup
 
 def update_images():
-    global img1, img2, current_activity
-    img1.image = pyglet.image.load(f'{IMG_DIR}{current_activity}_1.png')
-    img2.image = pyglet.image.load(f'{IMG_DIR}{current_activity}_2.png')
+    for img1, img2 in (cooldown_images, active_images):
+        img1.image = images[(current_activity, 1)]
+        img2.image = images[(current_activity, 2)]
 
 
 # Drawing the screens
 
 def draw_start_screen():
-    pyglet.text.Label('Welcome to FitnessTrainer!', font_name=FONT_NAME, font_size=36, color=FONT_COLOR, x=WINDOW_WIDTH//2, y=WINDOW_HEIGHT//2 + 40, anchor_x='center', anchor_y='center').draw()
-    pyglet.text.Label('Press any button to start your workout.', font_name=FONT_NAME, font_size=20, color=FONT_COLOR, x=WINDOW_WIDTH//2, y=WINDOW_HEIGHT//2 - 40, anchor_x='center', anchor_y='center').draw()
-    pyglet.text.Label('Follow the instructions once workout starts', font_name=FONT_NAME, font_size=20, color=FONT_COLOR, x=WINDOW_WIDTH//2, y=WINDOW_HEIGHT//2 - 120, anchor_x='center', anchor_y='center').draw()
+    start_batch.draw()
 
 def draw_loading_screen():
-    pyglet.text.Label('Preparing workout data...', font_name=FONT_NAME, font_size=36, color=FONT_COLOR, x=WINDOW_WIDTH//2, y=WINDOW_HEIGHT//2 + 40, anchor_x='center', anchor_y='center').draw()
-    pyglet.text.Label('This might take a few moments', font_name=FONT_NAME, font_size=15, color=FONT_COLOR, x=WINDOW_WIDTH//2, y=WINDOW_HEIGHT//2 - 40, anchor_x='center', anchor_y='center').draw()
+    loading_batch.draw()
 
 def draw_cooldown_screen():
-    veil = pyglet.shapes.Rectangle(x=0, y=0, width=WINDOW_WIDTH, height=WINDOW_HEIGHT, color=(100, 100, 100, 180))
-    img1.draw()
-    img2.draw()
-    veil.draw()
-    pyglet.text.Label(f'Next up: {current_activity}', font_name=FONT_NAME, font_size=30, color=(255, 255, 255), x=WINDOW_WIDTH//2, y=WINDOW_HEIGHT//2 + 40, anchor_x='center', anchor_y='center').draw()
-    pyglet.text.Label(f'in {round(cooldown, 1)} seconds', font_name=FONT_NAME, font_size=18, color=(255, 255, 255), x=WINDOW_WIDTH//2, y=WINDOW_HEIGHT//2 - 40, anchor_x='center', anchor_y='center').draw()
+    set_text(next_up_label, f'Next up: {current_activity}')
+    set_text(cooldown_label, f'in {round(cooldown, 1)} seconds')
+    cooldown_batch.draw()
 
 def draw_active_screen():
-    activity_label = pyglet.text.Label(f'ACTIVITY: {current_activity}', font_name=FONT_NAME, font_size=36, color=FONT_COLOR, x=WINDOW_WIDTH//2, y=WINDOW_HEIGHT//2 + 80, anchor_x='center', anchor_y='center')
-    pyglet.text.Label(f'{round(countdown, 1)} seconds', font_name=FONT_NAME, font_size=20, color=FONT_COLOR, x=WINDOW_WIDTH-100, y=WINDOW_HEIGHT-20, anchor_x='center').draw()
-    activity_label.color = ACTIVE_COLOR if current_activity == user_activity else (255, 0 , 0, 255)
-    activity_label.draw()
-    img1.draw()
-    img2.draw()
+    set_text(activity_label, f'ACTIVITY: {current_activity}')
+    set_color(activity_label, ACTIVE_COLOR if current_activity == user_activity else (255, 0 , 0, 255))
+    set_text(countdown_label, f'{round(countdown, 1)} seconds')
+    active_batch.draw()
 
 def draw_end_screen():
-    pyglet.text.Label('You did it!', font_name=FONT_NAME, font_size=36, color=FONT_COLOR, x=WINDOW_WIDTH//2, y=WINDOW_HEIGHT//2 + 40, anchor_x='center', anchor_y='center').draw()
-    pyglet.text.Label(f'You were on target for {score/(len(ACTIVITIES)*DURATION):.2%} of your workout.', font_name=FONT_NAME, font_size=20, color=FONT_COLOR, x=WINDOW_WIDTH//2, y=WINDOW_HEIGHT//2 - 40, anchor_x='center', anchor_y='center').draw()
+    set_text(end_score_label, f'You were on target for {score/(len(ACTIVITIES)*DURATION):.2%} of your workout.')
+    end_batch.draw()
+
+
+# Debug overlay and instrumentation. The hot paths are only instrumented once the overlay is shown for the first time
+
+def format_ms(seconds):
+    return '-' if seconds is None else f'{seconds * 1000:.1f}'
+
+def set_overlay(visible):
+    global show_overlay, last_frame_time
+    show_overlay = visible
+    last_frame_time = None
+    if visible:
+        if recognizer is not None:
+            instrumentation.instrument_recognizer(recognizer)
+        metrics.tracing = True
+
+def update_overlay(dt):
+    if not show_overlay:
+        return
+    # With the decision filter, the worker asks for the probabilities of every class instead of a single label
+    inference = (metrics.get_histogram('recognizer.get_probabilities') or metrics.get_histogram('recognizer.classify')
+                 or instrumentation.Histogram())
+    frames = metrics.get_histogram('ui.frame_interval') or instrumentation.Histogram()
+    samples = metrics.get_histogram('recognizer.get_live_data.size') or instrumentation.Histogram()
+    pred = recognition_worker.get_latest() if recognition_worker else None
+    prediction_age = time.time() - pred.timestamp if pred else None
+    set_text(overlay_labels[0], f'ingest: {metrics.rate("sensor.datagrams"):.0f} datagrams/s')
+    set_text(overlay_labels[1], f'inference: p50 {format_ms(inference.percentile(50))} ms, p99 {format_ms(inference.percentile(99))} ms')
+    set_text(overlay_labels[2], f'samples per update: p50 {samples.percentile(50) or 0:.0f}')
+    set_text(overlay_labels[3], f'frame: p50 {format_ms(frames.percentile(50))} ms, p99 {format_ms(frames.percentile(99))} ms')
+    first_correct = metrics.get_histogram('decision.time_to_first_correct') or instrumentation.Histogram()
+    set_text(overlay_labels[5], f'time to first correct decision: p50 {format_ms(first_correct.percentile(50))} ms, max {format_ms(first_correct.max if first_correct.count else None)} ms')
+    set_text(overlay_labels[4], f'prediction: {pred.label if pred else "-"} ({pred.confidence:.0%}), {format_ms(prediction_age)} ms old' if pred else 'prediction: -')
+
+def dump_trace():
+    os.makedirs(TRACE_DIR, exist_ok=True)
+    path = f"{TRACE_DIR}trace-{time.strftime('%Y%m%d-%H%M%S')}.json"
+    events = metrics.dump_trace(path)
+    print(f"Wrote {events} trace events to {path}")
+
+clock.schedule_interval(update_overlay, OVERLAY_RATE)
+set_overlay(DEBUG_OVERLAY)
+
+@win.event
+def on_key_press(symbol, modifiers):
+    if symbol == window.key.F3:
+        set_overlay(not show_overlay)
+    elif symbol == window.key.F4 and show_overlay:
+        dump_trace()
 
 
 # Registering button presses to start the workout
@@ -132,31 +283,48 @@ def handle_btn_press(data):
     if int(data) == 1 and not started and not finished:
         started = True
         in_cooldown = True
+        session_log.start()
+
+
+# Write the rest of the session log. The number of records is printed, and how many were dropped because the disk
+# was too slow
+
+def stop_session_log():
+    stats = session_log.stop() if session_log else None
+    if stats:
+        print(f"Logged {stats['records']} predictions to {', '.join(stats['files'])} ({stats['dropped']} dropped)")
 
-recognizer.sensor.register_callback('button_1', handle_btn_press)
-recognizer.sensor.register_callback('button_2', handle_btn_press)
-recognizer.sensor.register_callback('button_3', handle_btn_press)
-    
 
 @win.event
 def on_draw():
+    global last_frame_time
+    if show_overlay:
+        now = time.perf_counter()
+        if last_frame_time is not None:
+            metrics.record('ui.frame_interval', now - last_frame_time)
+        last_frame_time = now
     win.clear()
-    if not started and (not recognizer.finished_training or not recognizer.got_live_data):
+    if not started and not is_ready():
         draw_loading_screen()
-    elif not started and not finished and recognizer.finished_training and recognizer.got_live_data:
+    elif not started and not finished and is_ready():
         draw_start_screen()
     elif in_cooldown:
         draw_cooldown_screen()
-    elif started and recognizer.finished_training and recognizer.got_live_data:
+    elif started and is_ready():
         draw_active_screen()
     elif finished and not started:
         draw_end_screen()
+    if show_overlay:
+        overlay_batch.draw()
+    if PROFILE_STARTUP:
+        os._exit(0)
 
 
 # Make sure the program will actually stop upon closing the window
 
 @win.event
 def on_close():
+    stop_session_log()
     os._exit(0)
 
 pyglet.app.run()
\ No newline at end of file
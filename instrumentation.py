@@ -0,0 +1,188 @@
+import json
+import time
+import threading
+from collections import deque
+from functools import wraps
+import numpy as np
+
+# Lightweight counters and latency histograms for the hot paths. Nothing is measured until instrument()
+# (or one of the instrument_* helpers) wraps a method, so there is no overhead when instrumentation is off.
+# Histograms use fixed logarithmic buckets, so recording a value is O(1) and memory use doesn't grow.
+# Optionally, every measured call is also kept as trace event and can be dumped as Chrome trace json
+# (open it in chrome://tracing or https://ui.perfetto.dev)
+
+DURATION_RANGE = (1e-6, 10.0)   # Bucket boundaries of duration histograms (1 µs to 10 s)
+SIZE_RANGE = (1, 1e6)           # Bucket boundaries of size histograms (e.g. number of samples)
+BUCKETS_PER_DECADE = 20
+TRACE_SIZE = 100000         # Maximum number of trace events that are kept
+
+
+class Histogram:
+
+    def __init__(self, value_range=DURATION_RANGE):
+        low, high = value_range
+        self.boundaries = np.logspace(np.log10(low), np.log10(high), int(np.log10(high / low) * BUCKETS_PER_DECADE) + 1)
+        self.counts = np.zeros(len(self.boundaries) + 1, dtype=np.int64)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def record(self, value):
+        self.counts[np.searchsorted(self.boundaries, value)] += 1
+        self.count += 1
+        self.total += value
+        if value > self.max:
+            self.max = value
+
+    # Approximate percentile (upper boundary of the bucket the percentile falls into, at most the maximum)
+
+    def percentile(self, p):
+        if self.count == 0:
+            return None
+        index = int(np.searchsorted(np.cumsum(self.counts), self.count * p / 100))
+        return min(float(self.boundaries[min(index, len(self.boundaries) - 1)]), self.max)
+
+    def summary(self):
+        return {
+            'count': self.count,
+            'mean': self.total / self.count if self.count else None,
+            'p50': self.percentile(50),
+            'p99': self.percentile(99),
+            'max': self.max,
+        }
+
+
+class Metrics:
+
+    def __init__(self):
+        self.counters = {}
+        self.histograms = {}
+        self.tracing = False
+        self.trace = deque(maxlen=TRACE_SIZE)
+        self._rate_snapshots = {}
+        self._start = time.perf_counter()
+
+    def count(self, name, n=1):
+        self.counters[name] = self.counters.get(name, 0) + n
+
+    def record(self, name, value, value_range=DURATION_RANGE):
+        histogram = self.histograms.get(name)
+        if histogram is None:
+            histogram = self.histograms[name] = Histogram(value_range)
+        histogram.record(value)
+
+    # Rate of a counter per second since the last call to rate() for the same counter
+
+    def rate(self, name):
+        now = time.perf_counter()
+        value = self.counters.get(name, 0)
+        last_time, last_value = self._rate_snapshots.get(name, (self._start, 0))
+        self._rate_snapshots[name] = (now, value)
+        return (value - last_value) / (now - last_time) if now > last_time else 0.0
+
+    def get_histogram(self, name):
+        return self.histograms.get(name)
+
+    def summary(self):
+        return {
+            'counters': dict(self.counters),
+            'histograms': {name: histogram.summary() for name, histogram in list(self.histograms.items())},
+        }
+
+    def reset(self):
+        self.counters.clear()
+        self.histograms.clear()
+        self.trace.clear()
+        self._rate_snapshots.clear()
+
+    # Measure a block of code: with metrics.timed('name'): ...
+
+    def timed(self, name):
+        return _Timer(self, name)
+
+    def _add_duration(self, name, start, duration):
+        self.record(name, duration)
+        if self.tracing:
+            self.trace.append((name, start, duration, threading.get_ident()))
+
+    # Write the trace events as Chrome trace json
+
+    def dump_trace(self, path):
+        events = [{
+            'name': name,
+            'ph': 'X',
+            'ts': (start - self._start) * 1e6,
+            'dur': duration * 1e6,
+            'pid': 0,
+            'tid': thread_id,
+        } for name, start, duration, thread_id in list(self.trace)]
+        with open(path, 'w') as f:
+            json.dump({'traceEvents': events, 'metadata': self.summary()}, f)
+        return len(events)
+
+
+class _Timer:
+
+    def __init__(self, metrics, name):
+        self.metrics = metrics
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.metrics._add_duration(self.name, self.start, time.perf_counter() - self.start)
+
+
+# The metrics everything is recorded to
+metrics = Metrics()
+
+
+# Replace the method obj.method_name by a wrapper that records its duration as name. If counter is given,
+# the counter is increased with every call. If size_of is given, size_of(result) is recorded as name.size
+
+def instrument(obj, method_name, name, counter=None, size_of=None):
+    method = getattr(obj, method_name)
+    if getattr(method, '_instrumented', False):
+        return
+
+    @wraps(method)
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        result = method(*args, **kwargs)
+        metrics._add_duration(name, start, time.perf_counter() - start)
+        if counter is not None:
+            metrics.count(counter)
+        if size_of is not None:
+            metrics.record(f'{name}.size', size_of(result), SIZE_RANGE)
+        return result
+
+    wrapper._instrumented = True
+    setattr(obj, method_name, wrapper)
+
+
+# Count incoming datagrams (sensor.datagrams) and measure how long the sensor needs to handle them
+
+def instrument_sensor(sensor):
+    instrument(sensor, '_update', 'sensor.update', counter='sensor.datagrams')
+    if getattr(sensor, 'samples', None) is not None:
+        instrument(sensor, '_update_samples', 'sensor.update', counter='sensor.datagrams')
+
+
+# Measure the stages of the live prediction: reading the samples (and how many arrived), updating the window,
+# pushing the samples into the sliding window and getting its features, scaling and classification. The live window
+# is replaced by set_params, so instrument the recognizer again after changing its parameters
+
+def instrument_recognizer(recognizer):
+    if recognizer.sensor is not None:
+        instrument_sensor(recognizer.sensor)
+    instrument(recognizer, 'get_live_data', 'recognizer.get_live_data', size_of=len)
+    instrument(recognizer, 'update_live_window', 'recognizer.update_live_window')
+    instrument(recognizer.live_window, 'push', 'live_window.push')
+    instrument(recognizer.live_window, 'get_features', 'live_window.get_features')
+    instrument(recognizer.live_window, 'get_partial_features', 'live_window.get_partial_features')
+    instrument(recognizer, 'scale', 'recognizer.scale')
+    instrument(recognizer, 'classify_scaled', 'recognizer.classify_scaled')
+    instrument(recognizer, 'classify', 'recognizer.classify', counter='recognizer.predictions')
+    instrument(recognizer, 'get_probabilities', 'recognizer.get_probabilities', counter='recognizer.predictions')
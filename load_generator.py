@@ -0,0 +1,53 @@
+import time
+import socket
+import argparse
+from pathlib import Path
+from activity_recognizer import PORT
+from recognition_server import encode_datagram
+from recordings import load_recording, drop_missing
+from utils import DIRECTORY
+
+# Simulates many DIPPID devices by replaying the recordings in DIRECTORY. Every fake device sends from its own
+# socket (so it has its own sender address) and also sets a device_id field. Recordings are assigned to the
+# devices round-robin and loop when they end. All devices send one sample per tick at the given rate
+
+
+def load_generator(devices, rate, duration, host='127.0.0.1', port=PORT):
+    files = sorted(Path(DIRECTORY).rglob('*.csv'))
+    senders = []
+    for i in range(devices):
+        csv = files[i % len(files)]
+        _, channels = load_recording(csv)
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        senders.append((f'device-{i}', csv.parent.name, sock, drop_missing(channels)))
+
+    print(f"Sending {rate} samples per second from {devices} devices to {host}:{port} for {duration} seconds")
+    start_time = time.monotonic()
+    tick = 0
+    sent = 0
+    while time.monotonic() - start_time < duration:
+        for device_id, _, sock, channels in senders:
+            sock.sendto(encode_datagram(channels[tick % len(channels)], device_id=device_id), (host, port))
+            sent += 1
+        tick += 1
+        # Sleep until the next tick. If sending took too long, the next tick is sent right away
+        delay = start_time + tick / rate - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+
+    elapsed = time.monotonic() - start_time
+    print(f"Sent {sent} datagrams in {elapsed:.1f} seconds ({sent / elapsed:.0f} per second)")
+    for _, _, sock, _ in senders:
+        sock.close()
+    return {device_id: activity for device_id, activity, _, _ in senders}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Replay the recordings in data/ as many fake DIPPID devices')
+    parser.add_argument('--devices', type=int, default=10)
+    parser.add_argument('--rate', type=float, default=100, help='samples per second per device')
+    parser.add_argument('--duration', type=float, default=30, help='seconds')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=PORT)
+    args = parser.parse_args()
+    load_generator(args.devices, args.rate, args.duration, args.host, args.port)
@@ -0,0 +1,134 @@
+import os
+import json
+import hashlib
+from pathlib import Path
+
+# joblib is imported by the functions that need it: loading a model imports scikit-learn anyway, but
+# computing a fingerprint shouldn't
+
+# Increase whenever the layout of the stored model or the feature extraction changes,
+# so that models saved by older versions are not used anymore
+MODEL_VERSION = 2
+
+
+# Get a fingerprint of the training files and the parameters used for training.
+# Files are identified by their path, size and modification time so they don't have to be read
+
+def get_fingerprint(files, params):
+    fingerprint = hashlib.sha256()
+    fingerprint.update(f'{MODEL_VERSION}\n'.encode())
+    fingerprint.update(json.dumps(params, sort_keys=True).encode())
+    for file in sorted(Path(file) for file in files):
+        stat = file.stat()
+        fingerprint.update(f'\n{file.as_posix()}:{stat.st_size}:{stat.st_mtime_ns}'.encode())
+    return fingerprint.hexdigest()
+
+
+# Save the fitted scaler and classifier together with the fingerprint they were trained with
+
+def save_model(path, scaler, classifier, fingerprint):
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    model = {
+        'version': MODEL_VERSION,
+        'fingerprint': fingerprint,
+        'scaler': scaler,
+        'classifier': classifier,
+    }
+    # Write to a temporary file first so that a crash never leaves a half written model behind
+    import joblib
+    tmp_path = path.with_name(path.name + '.tmp')
+    joblib.dump(model, tmp_path)
+    os.replace(tmp_path, path)
+
+
+# Load a saved scaler and classifier. Returns None if there is no model or if it was
+# trained with other files or parameters (or by an older version)
+
+def load_model(path, fingerprint):
+    if not os.path.exists(path):
+        return None
+    import joblib
+    try:
+        # Memory-map the numpy arrays in the model (e.g. support vectors) instead of copying them
+        model = joblib.load(path, mmap_mode='r')
+    except Exception as e:
+        print(f"Could not load saved model: {e}")
+        return None
+
+    if model.get('version') != MODEL_VERSION or model.get('fingerprint') != fingerprint:
+        return None
+    return model['scaler'], model['classifier']
+
+
+# Cache of the extracted features of every training file. An entry is only used as long as the file's size,
+# modification time and the feature parameters (filter order, cutoff, sampling rate, ...) are unchanged.
+# Every file can have entries for several sets of parameters, e.g. while searching for the best parameters
+
+class FeatureCache:
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.entries = {}   # {file: {params json: {'stat': (size, mtime), 'features': ...}}}
+        self.changed = False
+        if self.path.exists():
+            import joblib
+            try:
+                cache = joblib.load(self.path)
+                if cache.get('version') == MODEL_VERSION:
+                    self.entries = cache['entries']
+            except Exception as e:
+                print(f"Could not load feature cache: {e}")
+
+    @staticmethod
+    def _get_stat(file):
+        stat = os.stat(file)
+        return stat.st_size, stat.st_mtime_ns
+
+    # Get the cached features of a file or None if the file or the parameters changed
+
+    def get(self, file, params):
+        entry = self.entries.get(Path(file).as_posix(), {}).get(json.dumps(params, sort_keys=True))
+        if entry is None or entry['stat'] != self._get_stat(file):
+            return None
+        return entry['features']
+
+    def put(self, file, params, features):
+        file_entries = self.entries.setdefault(Path(file).as_posix(), {})
+        stat = self._get_stat(file)
+        # Entries of an older version of the file are of no use anymore
+        for params_json in [key for key, entry in file_entries.items() if entry['stat'] != stat]:
+            del file_entries[params_json]
+        file_entries[json.dumps(params, sort_keys=True)] = {'stat': stat, 'features': features}
+        self.changed = True
+
+    # Get the features of all files. The features of files that are not cached are computed by
+    # featurize(missing_files), which returns them in the same order, and added to the cache
+
+    def get_many(self, files, params, featurize):
+        samples = [self.get(file, params) for file in files]
+        missing = [i for i, file_features in enumerate(samples) if file_features is None]
+        if missing:
+            for i, file_features in zip(missing, featurize([files[i] for i in missing])):
+                samples[i] = file_features
+                self.put(files[i], params, file_features)
+        return samples
+
+    # Remove the entries of files that don't exist anymore. Files that exist keep their entries even if they are not
+    # used for training at the moment, e.g. because only some participants are selected
+
+    def evict_missing(self):
+        for name in list(self.entries):
+            if not Path(name).exists():
+                del self.entries[name]
+                self.changed = True
+
+    def save(self):
+        if not self.changed:
+            return
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        import joblib
+        tmp_path = self.path.with_name(self.path.name + '.tmp')
+        joblib.dump({'version': MODEL_VERSION, 'entries': self.entries}, tmp_path)
+        os.replace(tmp_path, self.path)
+        self.changed = False
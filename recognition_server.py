@@ -0,0 +1,223 @@
+import sys
+import json
+import time
+import socket
+import selectors
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import features
+from activity_recognizer import Recognizer, Prediction, PORT
+from resampler import StreamResampler
+
+CLASSIFY_INTERVAL = 0.1     # Seconds between two classification rounds over all devices
+BATCH_SIZE = 64             # Maximum number of devices classified in one batch
+DEVICE_TIMEOUT = 10         # Devices that haven't sent anything for this many seconds are removed
+
+
+# Encode one sample (acc x/y/z, gyro x/y/z) as DIPPID datagram. Additional fields (e.g. device_id) are added as they are
+
+def encode_datagram(values, **fields):
+    data = {
+        'accelerometer': {'x': float(values[0]), 'y': float(values[1]), 'z': float(values[2])},
+        'gyroscope': {'x': float(values[3]), 'y': float(values[4]), 'z': float(values[5])},
+    }
+    data.update(fields)
+    return json.dumps(data).encode()
+
+
+# Decode a DIPPID datagram. Returns its device_id (None if it has none or it isn't a string or a number) and the
+# sample values as floats, or None if it has no valid sensor data
+
+def decode_datagram(data):
+    try:
+        data_json = json.loads(data)
+        acc = data_json['accelerometer']
+        gyro = data_json['gyroscope']
+        values = np.array([acc['x'], acc['y'], acc['z'], gyro['x'], gyro['y'], gyro['z']], dtype=float)
+    except (ValueError, KeyError, TypeError):
+        return None
+    if not np.isfinite(values).all():
+        return None
+    device_id = data_json.get('device_id')
+    if isinstance(device_id, bool) or not isinstance(device_id, (str, int)):
+        device_id = None
+    return device_id, values
+
+
+# Live data of one device: the same resampling and sliding window the Recognizer uses for a single sensor
+
+class Device:
+
+    def __init__(self, recognizer):
+        self.resampler = StreamResampler(recognizer.sampling_rate, method='linear', max_gap=recognizer.window_size)
+        self.window = features.SlidingWindowFeatures(recognizer.window_size, recognizer.butter_filter, recognizer.sampling_rate)
+        # The receiving thread updates the window while the classification reads it
+        self.lock = threading.Lock()
+        self.last_seen = 0
+        self.samples = 0
+        self.classified_samples = 0     # Number of samples at the time of the last classification
+        self.prediction = None
+
+    def push(self, timestamp, values):
+        with self.lock:
+            for _, resampled in self.resampler.push(timestamp, values):
+                if np.isnan(resampled).any():
+                    # The device paused for longer than a window, start over
+                    self.window.reset()
+                    continue
+                self.window.push(resampled)
+            self.samples += 1
+            self.last_seen = timestamp
+
+
+# Receives DIPPID datagrams from many devices on one port and classifies their activities.
+# Datagrams are assigned to devices by their "device_id" field (a string or a number) or, if there is none, by their
+# sender address. Datagrams without valid sensor values are counted in dropped and ignored.
+# Devices are classified in batches: the feature vectors of all devices with new data are stacked and scaled
+# and classified together, split into chunks of BATCH_SIZE that run on a pool of workers
+
+class RecognitionServer:
+
+    def __init__(self, recognizer, port=PORT, ip='0.0.0.0', interval=CLASSIFY_INTERVAL, workers=1, batch_size=BATCH_SIZE):
+        self.recognizer = recognizer
+        self.interval = interval
+        self.batch_size = batch_size
+        self.devices = {}
+        self.datagrams = 0
+        self.dropped = 0    # Datagrams that were dropped because they couldn't be decoded or processed
+        self._executor = ThreadPoolExecutor(max_workers=workers) if workers > 1 else None
+        self._sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self._sock.bind((ip, port))
+        self._sock.setblocking(False)
+        self._running = False
+        self._threads = []
+
+    def start(self):
+        self._running = True
+        self._threads = [threading.Thread(target=self._receive, daemon=True),
+                         threading.Thread(target=self._classify_loop, daemon=True)]
+        for thread in self._threads:
+            thread.start()
+
+    def stop(self):
+        self._running = False
+        for thread in self._threads:
+            thread.join()
+        self._sock.close()
+        if self._executor:
+            self._executor.shutdown()
+
+    # Get the latest prediction of every device as {device: Prediction}
+
+    def get_predictions(self):
+        return {device_id: device.prediction for device_id, device in list(self.devices.items()) if device.prediction}
+
+    def get_prediction(self, device_id):
+        device = self.devices.get(device_id)
+        return device.prediction if device else None
+
+    # Drain all waiting datagrams whenever the socket becomes readable
+
+    def _receive(self):
+        selector = selectors.DefaultSelector()
+        selector.register(self._sock, selectors.EVENT_READ)
+        while self._running:
+            if not selector.select(timeout=0.1):
+                continue
+            while True:
+                try:
+                    data, addr = self._sock.recvfrom(1024)
+                except (BlockingIOError, InterruptedError):
+                    break
+                except OSError:
+                    continue
+                try:
+                    self._handle_datagram(data, addr, time.time())
+                except Exception:
+                    # A single bad datagram must not stop the receiving of all devices
+                    self.dropped += 1
+        selector.close()
+
+    def _handle_datagram(self, data, addr, timestamp):
+        decoded = decode_datagram(data)
+        if decoded is None:
+            self.dropped += 1
+            return
+        device_id, values = decoded
+        if device_id is None:
+            device_id = f'{addr[0]}:{addr[1]}'
+        device = self.devices.get(device_id)
+        if device is None:
+            device = self.devices[device_id] = Device(self.recognizer)
+        device.push(timestamp, values)
+        self.datagrams += 1
+
+    def _classify_loop(self):
+        next_time = time.monotonic()
+        while self._running:
+            self.classify_devices()
+            next_time += self.interval
+            delay = next_time - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            else:
+                next_time = time.monotonic()
+
+    # Classify all devices that have a full window and received new samples since their last classification
+
+    def classify_devices(self):
+        now = time.time()
+        ready = []
+        for device_id, device in list(self.devices.items()):
+            if now - device.last_seen > DEVICE_TIMEOUT:
+                del self.devices[device_id]
+                continue
+            if device.samples == device.classified_samples:
+                continue
+            with device.lock:
+                if not device.window.is_full():
+                    continue
+                ready.append((device, device.window.get_features()))
+                device.classified_samples = device.samples
+
+        batches = [ready[i:i + self.batch_size] for i in range(0, len(ready), self.batch_size)]
+        if self._executor:
+            list(self._executor.map(self._classify_batch, batches))
+        else:
+            for batch in batches:
+                self._classify_batch(batch)
+        return len(ready)
+
+    def _classify_batch(self, batch):
+        feature_matrix = np.array([feature_vector for _, feature_vector in batch])
+        features_scaled = self.recognizer.scale(feature_matrix)
+        labels, confidences = self.recognizer.classify_scaled(features_scaled)
+        timestamp = time.time()
+        for (device, _), label, confidence in zip(batch, labels, confidences):
+            device.prediction = Prediction(label, timestamp, float(confidence))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Recognize the activities of many DIPPID devices sending to one port')
+    parser.add_argument('--port', type=int, default=PORT)
+    parser.add_argument('--interval', type=float, default=CLASSIFY_INTERVAL, help='seconds between two classification rounds')
+    parser.add_argument('--workers', type=int, default=1, help='number of threads that classify batches of devices')
+    args = parser.parse_args()
+
+    recognizer = Recognizer(listen=False)
+    recognizer.load_or_train_classifier()
+    server = RecognitionServer(recognizer, port=args.port, interval=args.interval, workers=args.workers)
+    server.start()
+    print(f"Listening on port {args.port}. Press Ctrl+C to stop")
+    try:
+        while True:
+            time.sleep(1)
+            predictions = server.get_predictions()
+            print(f"{len(server.devices)} devices, {server.datagrams} datagrams received, {server.dropped} dropped")
+            for device_id, prediction in sorted(predictions.items()):
+                print(f"  {device_id}: {prediction.label} ({prediction.confidence:.0%})")
+    except KeyboardInterrupt:
+        server.stop()
+        sys.exit(0)
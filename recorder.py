@@ -0,0 +1,152 @@
+import time
+import threading
+import numpy as np
+from recordings import CSV_HEADERS
+from resampler import StreamResampler
+
+BUFFER_SIZE = 4096      # Number of samples the ring buffer can hold before samples are dropped
+FLUSH_SIZE = 256        # Number of samples that are written to the file at once
+FLUSH_INTERVAL = 0.5    # Seconds after which buffered samples are written even if there are less than FLUSH_SIZE
+SAMPLING_RATE = 100     # Samples are resampled to this rate before they are stored
+CSV_FORMAT = ['%d', '%d'] + ['%.9g'] * (len(CSV_HEADERS) - 2)
+
+
+# Records accelerometer and gyroscope data of a DIPPID sensor to a csv file. A sample is taken from every message
+# the sensor receives (also if its values didn't change), resampled to SAMPLING_RATE and stored in a preallocated
+# ring buffer. A background thread writes
+# them to the file in batches, so taking a sample never waits for the disk. Rows are written in the same
+# format as resample.py produces it (timestamps in milliseconds, NaN for bins without samples)
+
+class Recorder:
+
+    def __init__(self, sensor, file_path, buffer_size=BUFFER_SIZE, flush_size=FLUSH_SIZE, sampling_rate=SAMPLING_RATE):
+        self.sensor = sensor
+        self.resampler = StreamResampler(sampling_rate)
+        self.file_path = file_path
+        self.flush_size = flush_size
+        self.buffer = np.zeros((buffer_size, len(CSV_HEADERS)))
+        self.is_recording = False
+        self._writer_thread = None
+        self._wake_writer = threading.Event()
+        self._pending = {}
+        self._reset()
+        sensor.register_message_callback(self._handle_message)
+
+    def _reset(self):
+        # Only the sensor thread advances written and only the writer thread advances flushed,
+        # so the ring buffer needs no lock
+        self.received = 0   # Number of samples taken from the sensor
+        self.written = 0    # Number of resampled rows put into the buffer
+        self.flushed = 0
+        self.dropped = 0    # Number of rows that didn't fit into the buffer and of samples that were lost or merged
+        self.gaps = 0       # Number of resampled rows without any sample
+        self.start_time = 0
+        self.stop_time = 0
+
+    # Called by the sensor thread for every message. Usually accelerometer and gyroscope data come in the same
+    # message and make one sample. If a message only has one of them, it is kept until the other one arrives and
+    # both are merged into one sample. A value that is replaced before the other one arrives is lost. Merged and
+    # lost samples count as dropped
+
+    def _handle_message(self, timestamp, message):
+        if not self.is_recording:
+            return
+        acc_data = message.get('accelerometer')
+        gyro_data = message.get('gyroscope')
+        if acc_data and gyro_data:
+            self.dropped += len(self._pending)
+            self._pending.clear()
+            self._take_sample(timestamp, acc_data, gyro_data)
+            return
+        for key, value in (('accelerometer', acc_data), ('gyroscope', gyro_data)):
+            if value:
+                if key in self._pending:
+                    self.dropped += 1
+                self._pending[key] = value
+        if len(self._pending) == 2:
+            self.dropped += 1
+            self._take_sample(timestamp, self._pending['accelerometer'], self._pending['gyroscope'])
+            self._pending.clear()
+
+    def _take_sample(self, timestamp, acc_data, gyro_data):
+        try:
+            values = (acc_data['x'], acc_data['y'], acc_data['z'], gyro_data['x'], gyro_data['y'], gyro_data['z'])
+        except (KeyError, TypeError):
+            # unexpected format
+            self.dropped += 1
+            return
+        self.received += 1
+        for row_timestamp, resampled in self.resampler.push(timestamp, values):
+            self._add_row(row_timestamp, resampled)
+
+    def _add_row(self, timestamp, values):
+        if self.written - self.flushed >= len(self.buffer):
+            # The writer can't keep up and the buffer is full
+            self.dropped += 1
+            return
+        if np.isnan(values).any():
+            self.gaps += 1
+
+        row = self.buffer[self.written % len(self.buffer)]
+        row[0] = self.written
+        row[1] = round(timestamp * 1000)
+        row[2:] = values
+        self.written += 1
+        if self.written - self.flushed >= self.flush_size:
+            self._wake_writer.set()
+
+    def start(self):
+        if self.is_recording:
+            return
+        self._reset()
+        self._pending.clear()
+        self.resampler.reset()
+        self._file = open(self.file_path, 'w', newline='')
+        self._file.write(','.join(CSV_HEADERS) + '\n')
+        self.start_time = time.time()
+        self.is_recording = True
+        self._writer_thread = threading.Thread(target=self._write_loop, daemon=True)
+        self._writer_thread.start()
+
+    # Stop recording, write the remaining samples and return statistics about the recording.
+    # The last, unfinished bin of the resampler is discarded
+
+    def stop(self):
+        if not self.is_recording:
+            return None
+        self.is_recording = False
+        self.stop_time = time.time()
+        self._wake_writer.set()
+        self._writer_thread.join()
+        self._file.close()
+        return self.get_stats()
+
+    def get_stats(self):
+        duration = (self.stop_time or time.time()) - self.start_time
+        return {
+            'samples': self.received,
+            'rows': self.written,
+            'gaps': self.gaps,
+            'dropped': self.dropped,
+            'duration': duration,
+            'sample_rate': self.received / duration if duration > 0 else 0,
+        }
+
+    def _write_loop(self):
+        while self.is_recording:
+            self._wake_writer.wait(FLUSH_INTERVAL)
+            self._wake_writer.clear()
+            self._flush()
+        self._flush()
+
+    # Write all buffered samples to the file. The part of the ring buffer may wrap around, then it is
+    # written in two pieces
+
+    def _flush(self):
+        end = self.written
+        while self.flushed < end:
+            start_index = self.flushed % len(self.buffer)
+            count = min(end - self.flushed, len(self.buffer) - start_index)
+            np.savetxt(self._file, self.buffer[start_index:start_index + count], delimiter=',', fmt=CSV_FORMAT)
+            self.flushed += count
+        self._file.flush()
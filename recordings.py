@@ -0,0 +1,132 @@
+import os
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+import numpy as np
+import features
+from utils import CHANNELS
+
+# Recordings are stored as csv files. Next to them, a binary copy can be stored as two .npy files:
+# the sensor channels as a float32 (N, 6) array and the timestamps as a float64 (N,) array.
+# They can be memory-mapped, so loading them neither parses text nor copies the data.
+# pandas is only imported to read and write csv files, it takes long to import
+CHANNELS_SUFFIX = '.channels.npy'
+TIMESTAMPS_SUFFIX = '.timestamps.npy'
+CSV_HEADERS = ['id', 'timestamp'] + CHANNELS
+
+
+def get_binary_paths(csv):
+    csv = Path(csv)
+    return csv.with_name(csv.stem + CHANNELS_SUFFIX), csv.with_name(csv.stem + TIMESTAMPS_SUFFIX)
+
+
+# Check if the binary copy of a recording exists and is at least as new as the csv file
+
+def has_binary(csv):
+    channels_path, timestamps_path = get_binary_paths(csv)
+    if not channels_path.exists() or not timestamps_path.exists():
+        return False
+    if not os.path.exists(csv):
+        return True
+    csv_mtime = os.stat(csv).st_mtime_ns
+    return os.stat(channels_path).st_mtime_ns >= csv_mtime and os.stat(timestamps_path).st_mtime_ns >= csv_mtime
+
+
+def read_csv(csv):
+    import pandas as pd
+    csv_df = pd.read_csv(csv)
+    return csv_df['timestamp'].to_numpy(dtype=float), csv_df[CHANNELS].to_numpy(dtype=float)
+
+
+# Load a recording as (timestamps, channels). The binary copy is memory-mapped if it is available and
+# up to date, otherwise the csv file is parsed. Rows may contain NaN values (e.g. from resampling)
+
+def load_recording(csv):
+    if has_binary(csv):
+        channels_path, timestamps_path = get_binary_paths(csv)
+        return np.load(timestamps_path, mmap_mode='r'), np.load(channels_path, mmap_mode='r')
+    return read_csv(csv)
+
+
+def write_binary(csv, timestamps, channels):
+    channels_path, timestamps_path = get_binary_paths(csv)
+    np.save(timestamps_path, np.asarray(timestamps, dtype=np.float64))
+    np.save(channels_path, np.asarray(channels, dtype=np.float32))
+
+
+# Save a recording as csv file and as binary copy
+
+def save_recording(csv, timestamps, channels):
+    import pandas as pd
+    df = pd.DataFrame(np.asarray(channels), columns=CHANNELS)
+    df.insert(0, 'timestamp', timestamps)
+    df.index.name = 'id'
+    df.to_csv(csv, index=True)
+    write_binary(csv, timestamps, channels)
+
+
+# Create the binary copy of a csv recording. Returns False if it was already up to date
+
+def convert_recording(csv, force=False):
+    if not force and has_binary(csv):
+        return False
+    write_binary(csv, *read_csv(csv))
+    return True
+
+
+# Get the timestamps of a recording in seconds. Resampled recordings store milliseconds, recordings that were
+# not resampled store seconds. At sampling rates of a few hundred Hz or less, a median step of one or more
+# means milliseconds
+
+def timestamps_in_seconds(timestamps):
+    timestamps = np.asarray(timestamps, dtype=float)
+    if len(timestamps) > 1 and np.median(np.diff(timestamps)) >= 1:
+        return timestamps / 1000
+    return timestamps
+
+
+# Remove rows that contain NaN values in any channel
+
+def drop_missing(channels):
+    return channels[~np.isnan(channels).any(axis=1)]
+
+
+# Recordings are named name-activity-n.csv and stored in a directory named after the activity
+
+def get_participant(csv):
+    return Path(csv).stem.split('-')[0]
+
+
+def get_activity(csv):
+    return Path(csv).parent.name
+
+
+# Load a recording and get the features of its windows as a (W, NUM_FEATURES) array.
+# Only takes plain arguments so it can run in a worker process
+
+def featurize_file(csv, params):
+    sos = features.make_filter(params['order'], params['cutoff_frequency'], params['sampling_rate'])
+    _, channels = load_recording(csv)
+    return features.window_features(drop_missing(channels), sos, params['sampling_rate'], params['window_size'], params['window_stride'])
+
+
+# Get the features of many recordings using several workers. The results come back in the order of files,
+# so the feature matrix is the same as when loading the files one after another.
+# workers=None uses one worker per core, workers=1 loads the files in the calling thread
+
+def featurize_files(files, params, workers=None, processes=False):
+    files = list(files)
+    if workers is None:
+        workers = os.cpu_count() or 1
+    workers = min(workers, len(files))
+    if workers <= 1:
+        return [featurize_file(csv, params) for csv in files]
+
+    if processes:
+        # Send the files to the processes in chunks to keep the overhead per file small
+        chunksize = max(1, len(files) // (workers * 4))
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            return list(executor.map(featurize_file, files, [params] * len(files), chunksize=chunksize))
+
+    # numpy, scipy and the pandas csv parser release the GIL for most of their work, so threads work as well
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(featurize_file, files, [params] * len(files)))
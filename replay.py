@@ -0,0 +1,156 @@
+import time
+import socket
+import argparse
+import threading
+from pathlib import Path
+import numpy as np
+from activity_recognizer import Recognizer, PORT, CLASS_LABELS
+from decision import DecisionFilter
+from recognition_server import encode_datagram
+from recordings import load_recording, timestamps_in_seconds
+from resampler import StreamResampler
+from utils import DIRECTORY
+
+# Replays recordings as live DIPPID traffic, with the timing of the original timestamps. speed scales the
+# timing (2 replays twice as fast), speed=0 sends as fast as possible. Every datagram carries the time it was
+# sent in a replay_sent field, which is used to measure the latency from sending a sample to its prediction
+
+SENT_KEY = 'replay_sent'
+
+
+def get_files(paths):
+    files = []
+    for path in paths:
+        path = Path(path)
+        files += sorted(path.rglob('*.csv')) if path.is_dir() else [path]
+    return files
+
+
+# Send the recordings one after another. Rows with missing values are skipped. Returns the number of datagrams sent
+
+def replay(files, host='127.0.0.1', port=PORT, speed=1.0, stop_event=None):
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sent = 0
+    for csv in files:
+        timestamps, channels = load_recording(csv)
+        timestamps = timestamps_in_seconds(timestamps)
+        valid = ~np.isnan(channels).any(axis=1)
+        timestamps, channels = timestamps[valid], channels[valid]
+        start_time = time.monotonic()
+        for timestamp, values in zip(timestamps, channels):
+            if stop_event is not None and stop_event.is_set():
+                sock.close()
+                return sent
+            if speed > 0:
+                delay = start_time + (timestamp - timestamps[0]) / speed - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+            sock.sendto(encode_datagram(values, **{SENT_KEY: time.time()}), (host, port))
+            sent += 1
+    sock.close()
+    return sent
+
+
+# Replay the recordings to a Recognizer in this process and measure how long it takes from sending a sample
+# until a prediction that includes it is available. The recognizer predicts as often as new samples arrive
+# (or at most every interval seconds). Every recording is replayed separately, so predictions can be compared to
+# the activity of the recording. The recognizer's resampler is sped up by the same factor as the replay,
+# so it sees the recording's original timing; when sending as fast as possible the samples are used as they are.
+# With decision=True the predictions go through a DecisionFilter, like in fitness_trainer. For every recording the
+# time until the first correct decision is measured in recording time (samples / sampling rate), so it doesn't
+# depend on the replay speed
+
+def measure(files, port=PORT, speed=1.0, interval=0, decision=True):
+    recognizer = Recognizer(port=port)
+    recognizer.load_or_train_classifier()
+    recognizer.live_resampler = StreamResampler(recognizer.sampling_rate * speed, method='linear', max_gap=recognizer.window_size) if speed > 0 else None
+    decision_filter = DecisionFilter(CLASS_LABELS) if decision else None
+    min_samples = decision_filter.early_min_samples if decision else None
+    latencies = []
+    times_to_first_correct = []
+    correct = 0
+    predictions = 0
+    label_changes = 0
+    sent = 0
+    start_time = time.monotonic()
+    for csv in files:
+        done = threading.Event()
+        sender_result = []
+        sender = threading.Thread(target=lambda: sender_result.append(replay([csv], port=port, speed=speed)) or done.set(), daemon=True)
+        sender.start()
+        last_label = None
+        first_correct = None
+        while not done.is_set() or recognizer.sensor.samples.count > recognizer.next_sample:
+            # The send time is read before the window is updated. The datagram it belongs to is already in the
+            # sensor's ring buffer at that point, so it is part of the prediction
+            sent_time = recognizer.sensor.get_value(SENT_KEY)
+            window_count = recognizer.live_window.count
+            feature_vector = recognizer.update_live_window(min_samples)
+            # Only a window with new samples is predicted, otherwise the same window would be counted again and
+            # again (with a growing latency) while waiting for the next datagram
+            if feature_vector is not None and sent_time and recognizer.live_window.count != window_count:
+                recording_time = recognizer.live_window.count / recognizer.sampling_rate
+                if decision_filter:
+                    partial = not recognizer.live_window.is_full()
+                    label = decision_filter.update(recognizer.get_probabilities(feature_vector), recording_time, partial)
+                else:
+                    label, _ = recognizer.classify(feature_vector)
+                if label is not None:
+                    latencies.append(time.time() - sent_time)
+                    predictions += 1
+                    correct += label == csv.parent.name
+                    label_changes += last_label is not None and label != last_label
+                    last_label = label
+                    if first_correct is None and label == csv.parent.name:
+                        first_correct = recording_time
+            if interval > 0:
+                time.sleep(interval)
+            elif done.is_set():
+                # The last datagrams may still be on their way
+                time.sleep(0.01)
+        sender.join()
+        sent += sender_result[0]
+        times_to_first_correct.append(first_correct)
+        # Start the next recording with an empty window
+        recognizer.reset_live_data()
+        if decision_filter:
+            decision_filter.reset()
+    elapsed = time.monotonic() - start_time
+    recognizer.sensor.disconnect()
+
+    latencies = np.array(latencies) * 1000
+    found = np.array([t for t in times_to_first_correct if t is not None])
+    return {
+        'files': len(files),
+        'datagrams_sent': sent,
+        'samples_received': int(recognizer.sensor.samples.count),
+        'predictions': predictions,
+        'predictions_per_second': predictions / elapsed,
+        'accuracy': correct / predictions if predictions else None,
+        'latency_ms': {f'p{p}': float(np.percentile(latencies, p)) for p in (50, 90, 99)} if predictions else None,
+        'max_latency_ms': float(latencies.max()) if predictions else None,
+        'time_to_first_correct_s': {f'p{p}': float(np.percentile(found, p)) for p in (50, 90, 99)} if len(found) else None,
+        'files_never_correct': len(files) - len(found),
+        'label_changes_per_file': label_changes / len(files) if files else None,
+        'elapsed': elapsed,
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Replay recordings as live DIPPID traffic')
+    parser.add_argument('paths', nargs='*', default=[DIRECTORY], help='csv files or directories (default: data/)')
+    parser.add_argument('--speed', type=float, default=1.0, help='replay speed factor, 0 sends as fast as possible')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=PORT)
+    parser.add_argument('--send-only', action='store_true', help='only send the data, e.g. to a running fitness_trainer.py')
+    parser.add_argument('--interval', type=float, default=0, help='seconds between two predictions when measuring')
+    parser.add_argument('--no-decision', action='store_true', help='measure the raw predictions of every window instead of the smoothed decisions')
+    args = parser.parse_args()
+
+    files = get_files(args.paths)
+    if args.send_only:
+        print(f"Sent {replay(files, args.host, args.port, args.speed)} datagrams")
+    else:
+        results = measure(files, args.port, args.speed, args.interval, not args.no_decision)
+        for key, value in results.items():
+            print(f"{key}: {value}")
@@ -1,22 +1,25 @@
-import pandas as pd
+import numpy as np
+from recordings import load_recording, save_recording
+from resampler import StreamResampler
 from utils import FILE_PATH
 
-# read csv
-df = pd.read_csv(FILE_PATH)
+# Resample a recording that was saved with its original timestamps (in seconds) to 100Hz - one data
+# point every 10ms. Recordings made with gather_data.py are already resampled while recording,
+# this is only needed for older recordings
 
-# convert timestamps to datetime format
-df['timestamp'] = pd.to_datetime(df['timestamp'], unit='s')
+# read recording (memory-mapped binary copy if available, csv otherwise)
+timestamps, channels = load_recording(FILE_PATH)
 
-# do resample (100Hz - one data point every 10ms)
-df.set_index('timestamp', inplace=True)
-df_resampled = df.resample('10ms').mean() 
+# do resample with the same resampler the recorder uses
+resampler = StreamResampler(rate=100, num_channels=channels.shape[1])
+bins = []
+for timestamp, values in zip(timestamps, channels):
+    bins += resampler.push(timestamp, values)
+bins += resampler.flush()
 
-# reset index from 1 to n instead of using original indices
-df_resampled.reset_index(inplace=True)
+# convert timestamps to milliseconds
+timestamps_resampled = np.array([round(timestamp * 1000) for timestamp, _ in bins], dtype=np.int64)
+channels_resampled = np.array([values for _, values in bins])
 
-# convert back to timestamps 
-df_resampled['timestamp'] = (df_resampled['timestamp'] - pd.Timestamp("1970-01-01")) // pd.Timedelta('1ms')
-
-# save resampled data to to csv using 'id' as index column name
-df_resampled.index.name = 'id'
-df_resampled.to_csv(FILE_PATH, index=True)
+# save resampled data to csv (using 'id' as index column name) and as binary copy
+save_recording(FILE_PATH, timestamps_resampled, channels_resampled)
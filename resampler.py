@@ -0,0 +1,78 @@
+import math
+import numpy as np
+
+
+# Converts timestamped samples to a fixed rate grid while they stream in. Every sample falls into the bin
+# of length 1/rate that contains its timestamp (bins are aligned to multiples of 1/rate, just like
+# pandas' resample). Once a later bin is reached, the finished bin is emitted with the mean of its samples.
+# Bins without samples are either emitted as NaN ('mean', like df.resample().mean()) or filled by
+# linearly interpolating between the last bin and the new sample ('linear'). Interpolating across a long pause
+# would only make up data, so with 'linear' a gap of more than max_gap bins is marked by a single NaN bin instead:
+# the samples after it don't continue the ones before
+
+class StreamResampler:
+
+    def __init__(self, rate=100, num_channels=6, method='mean', max_gap=None):
+        if method not in ('mean', 'linear'):
+            raise ValueError(f'Unknown resampling method "{method}"')
+        self.rate = rate
+        self.num_channels = num_channels
+        self.method = method
+        self.max_gap = max_gap  # Longest gap (in bins) that is interpolated, None for no limit
+        self.reset()
+
+    def reset(self):
+        self.current_bin = None
+        self.sum = np.zeros(self.num_channels)
+        self.count = 0
+        self.last_value = None
+
+    def get_bin(self, timestamp):
+        return math.floor(timestamp * self.rate)
+
+    def get_bin_timestamp(self, bin_index):
+        return bin_index / self.rate
+
+    # Add a sample (timestamp in seconds). Returns a list of (timestamp, values) for every bin that was finished
+
+    def push(self, timestamp, values):
+        values = np.asarray(values, dtype=float)
+        bin_index = self.get_bin(timestamp)
+        finished = []
+        if self.current_bin is None:
+            self.current_bin = bin_index
+        elif bin_index > self.current_bin:
+            finished.append(self._finish_bin())
+            gap = bin_index - self.current_bin - 1
+            if self.method == 'linear' and self.max_gap is not None and gap > self.max_gap:
+                finished.append((self.get_bin_timestamp(self.current_bin + 1), np.full(self.num_channels, np.nan)))
+                gap = 0
+            for i in range(1, gap + 1):
+                if self.method == 'linear':
+                    filled = self.last_value + (values - self.last_value) * (i / (gap + 1))
+                else:
+                    filled = np.full(self.num_channels, np.nan)
+                finished.append((self.get_bin_timestamp(self.current_bin + i), filled))
+            self.current_bin = bin_index
+        # Samples that arrive late (with a timestamp of an earlier bin) are counted to the current bin
+
+        self.sum += values
+        self.count += 1
+        return finished
+
+    # Emit the current bin even though it might not be finished yet (e.g. at the end of a recording)
+
+    def flush(self):
+        if self.current_bin is None or self.count == 0:
+            return []
+        finished = [self._finish_bin()]
+        self.current_bin += 1
+        return finished
+
+    def _finish_bin(self):
+        value = self.sum / self.count
+        finished = (self.get_bin_timestamp(self.current_bin), value)
+        self.last_value = value
+        self.sum = np.zeros(self.num_channels)
+        self.count = 0
+        return finished
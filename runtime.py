@@ -0,0 +1,267 @@
+import os
+import json
+import numpy as np
+import features
+
+# Inference without scipy and scikit-learn. export_runtime.py compiles a trained scaler and classifier and the
+# Butterworth filter into a single .npz file of plain arrays, stored as float32 and, where the predictions
+# don't change, as int8. This module only needs numpy to load that file and predict. Scaler and classifier
+# provide the same methods the Recognizer uses on the scikit-learn objects (transform, predict_proba,
+# predict, classes_), so they can replace them
+
+RUNTIME_VERSION = 1
+QUANTIZED_SUFFIX = '.int8'
+SCALE_SUFFIX = '.scale'
+
+
+# Filter the signal x of shape (..., N, channels) along axis -2 with second-order sections, like
+# scipy.signal.sosfilt. Runs one time step at a time over all sections (direct form II transposed)
+
+def sosfilt(sos, x):
+    x = np.array(x, dtype=float)
+    zi = np.zeros((len(sos), 2) + x.shape[:-2] + x.shape[-1:])
+    y = np.moveaxis(x, -2, 0)   # view of x with the time axis first, filtered in place
+    for n in range(len(y)):
+        sample = y[n]
+        for (b0, b1, b2, _, a1, a2), z in zip(sos, zi):
+            out = b0 * sample + z[0]
+            z[0] = b1 * sample - a1 * out + z[1]
+            z[1] = b2 * sample - a2 * out
+            sample = out
+        y[n] = sample
+    return x
+
+
+# Store a 2D array as int8 with one float32 scale per row (or a 1D array with a single scale)
+
+def quantize(array):
+    array = np.asarray(array, dtype=np.float32)
+    scale = np.abs(array).max(axis=-1, keepdims=True) / 127
+    scale[scale == 0] = 1
+    return np.round(array / scale).astype(np.int8), scale.astype(np.float32)
+
+
+def dequantize(quantized, scale):
+    return quantized.astype(np.float32) * scale
+
+
+# Apply the same transformation as a fitted StandardScaler
+
+class Scaler:
+
+    def __init__(self, mean, scale):
+        self.mean = mean
+        self.scale = scale
+
+    def transform(self, samples):
+        return (np.asarray(samples, dtype=np.float32) - self.mean) / self.scale
+
+
+# A classifier with sigmoid calibration (as CalibratedClassifierCV with ensemble=False). Subclasses compute the
+# uncalibrated response of the estimator, one column per class; every column has its own sigmoid
+
+class Classifier:
+
+    def __init__(self, arrays):
+        self.classes_ = arrays['classes']
+        self.calibration_a = arrays['calibration_a']
+        self.calibration_b = arrays['calibration_b']
+
+    def response(self, samples):
+        raise NotImplementedError
+
+    def predict_proba(self, samples):
+        response = self.response(np.asarray(samples, dtype=np.float32))
+        proba = 1 / (1 + np.exp(self.calibration_a * response + self.calibration_b))
+        total = proba.sum(axis=1, keepdims=True)
+        return np.divide(proba, total, out=np.full_like(proba, 1 / proba.shape[1]), where=total != 0)
+
+    def predict(self, samples):
+        return self.classes_[np.argmax(self.predict_proba(samples), axis=1)]
+
+
+# Linear SVM (one-vs-rest)
+
+class LinearClassifier(Classifier):
+
+    def __init__(self, arrays):
+        super().__init__(arrays)
+        self.coef = arrays['coef']
+        self.intercept = arrays['intercept']
+
+    def response(self, samples):
+        return samples @ self.coef.T + self.intercept
+
+
+# Linear SVM on the Nyström approximation of an RBF kernel
+
+class NystroemClassifier(LinearClassifier):
+
+    def __init__(self, arrays):
+        super().__init__(arrays)
+        self.components = arrays['components']
+        self.normalization = arrays['normalization']
+        self.gamma = float(arrays['gamma'])
+
+    def response(self, samples):
+        distances = (samples * samples).sum(axis=1)[:, None] - 2 * samples @ self.components.T + (self.components * self.components).sum(axis=1)
+        kernel = np.exp(-self.gamma * np.maximum(distances, 0))
+        return super().response(kernel @ self.normalization.T)
+
+
+# SVC with a polynomial kernel. libsvm trains one classifier per pair of classes, their decisions are turned into
+# one score per class by votes plus the normalized sum of the confidences (like decision_function_shape='ovr')
+
+class KernelClassifier(Classifier):
+
+    def __init__(self, arrays):
+        super().__init__(arrays)
+        self.support_vectors = arrays['support_vectors']
+        self.dual_coef = arrays['dual_coef']
+        self.intercept = arrays['intercept']
+        self.n_support = arrays['n_support']
+        self.gamma, self.coef0, self.degree = arrays['kernel_params']
+
+    def response(self, samples):
+        kernel = (self.gamma * samples @ self.support_vectors.T + self.coef0) ** int(self.degree)
+        n_classes = len(self.n_support)
+        starts = np.concatenate(([0], np.cumsum(self.n_support)))
+        votes = np.zeros((len(samples), n_classes), dtype=np.float32)
+        confidences = np.zeros((len(samples), n_classes), dtype=np.float32)
+        k = 0
+        for i in range(n_classes):
+            for j in range(i + 1, n_classes):
+                sv_i = slice(starts[i], starts[i + 1])
+                sv_j = slice(starts[j], starts[j + 1])
+                decision = kernel[:, sv_i] @ self.dual_coef[j - 1, sv_i] + kernel[:, sv_j] @ self.dual_coef[i, sv_j] + self.intercept[k]
+                votes[:, i] += decision >= 0
+                votes[:, j] += decision < 0
+                confidences[:, i] += decision
+                confidences[:, j] -= decision
+                k += 1
+        return votes + confidences / (3 * (np.abs(confidences) + 1))
+
+
+# Ensemble of decision trees. The nodes of all trees are stored in flat arrays, all trees are walked at once.
+# Leaves point to themselves, so walking max_depth steps ends in a leaf for every tree
+
+class ForestClassifier(Classifier):
+
+    def __init__(self, arrays):
+        super().__init__(arrays)
+        self.roots = arrays['roots']
+        self.feature = arrays['feature']
+        self.threshold = arrays['threshold']
+        self.left = arrays['left']
+        self.right = arrays['right']
+        self.value = arrays['value']
+        self.max_depth = int(arrays['max_depth'])
+
+    def response(self, samples):
+        nodes = np.broadcast_to(self.roots, (len(samples), len(self.roots)))
+        rows = np.arange(len(samples))[:, None]
+        for _ in range(self.max_depth):
+            go_left = samples[rows, self.feature[nodes]] <= self.threshold[nodes]
+            nodes = np.where(go_left, self.left[nodes], self.right[nodes])
+        return self.value[nodes].mean(axis=1)
+
+
+CLASSIFIER_TYPES = {
+    'linear': LinearClassifier,
+    'nystroem': NystroemClassifier,
+    'svc': KernelClassifier,
+    'forest': ForestClassifier,
+}
+
+
+# Write the arrays of a compiled model. quantized names the arrays stored as int8
+
+def save_model(path, meta, arrays, quantized=()):
+    stored = {'meta': np.array(json.dumps({**meta, 'version': RUNTIME_VERSION}))}
+    for name, array in arrays.items():
+        if name in quantized:
+            stored[name + QUANTIZED_SUFFIX], stored[name + SCALE_SUFFIX] = quantize(array)
+        else:
+            stored[name] = array
+    tmp_path = f'{path}.tmp.npz'
+    np.savez(tmp_path, **stored)
+    os.replace(tmp_path, path)
+
+
+# Load a compiled model. Returns (meta, scaler, classifier) or None if there is no model or, if a fingerprint is
+# given, it was compiled from a model trained with other files or parameters
+
+def load_model(path, fingerprint=None):
+    if not os.path.exists(path):
+        return None
+    with np.load(path, allow_pickle=False) as stored:
+        meta = json.loads(str(stored['meta']))
+        if meta.get('version') != RUNTIME_VERSION or (fingerprint is not None and meta.get('fingerprint') != fingerprint):
+            return None
+        arrays = {}
+        for name in stored.files:
+            if name.endswith(QUANTIZED_SUFFIX):
+                base = name[:-len(QUANTIZED_SUFFIX)]
+                arrays[base] = dequantize(stored[name], stored[base + SCALE_SUFFIX])
+            elif not name.endswith(SCALE_SUFFIX):
+                arrays[name] = stored[name]
+    return meta, Scaler(arrays['scaler_mean'], arrays['scaler_scale']), CLASSIFIER_TYPES[meta['classifier']](arrays)
+
+
+# Get the filter of a compiled model (as second-order sections) if it was made with the given parameters, otherwise
+# None. Only the meta data is read, so the Recognizer can get its filter without importing scipy
+
+def load_filter(path, order, cutoff_frequency, sampling_rate):
+    if not os.path.exists(path):
+        return None
+    with np.load(path, allow_pickle=False) as stored:
+        meta = json.loads(str(stored['meta']))
+    if meta.get('version') != RUNTIME_VERSION or \
+            (meta.get('order'), meta.get('cutoff_frequency'), meta.get('sampling_rate')) != (order, cutoff_frequency, sampling_rate):
+        return None
+    return np.array(meta['sos'])
+
+
+# Predicts activities with nothing but numpy, from a file written by export_runtime.py
+
+class RuntimeRecognizer:
+
+    def __init__(self, path, fingerprint=None):
+        model = load_model(path, fingerprint)
+        if model is None:
+            raise ValueError(f"No compiled model in {path}")
+        self.meta, self.scaler, self.classifier = model
+        self.sos = np.asarray(self.meta['sos'])
+        self.sampling_rate = self.meta['sampling_rate']
+        self.window_size = self.meta['window_size']
+        self.labels = np.array(self.meta['labels'], dtype=object)
+
+    # Filter a whole recording of shape (N, 6), cut it into windows and get their features (see features.window_features)
+
+    def window_features(self, data, stride=1):
+        filtered = sosfilt(self.sos, data)
+        if len(filtered) < self.window_size:
+            return np.empty((0, features.NUM_FEATURES))
+        windows = np.lib.stride_tricks.sliding_window_view(filtered, self.window_size, axis=0)[::stride].transpose(0, 2, 1)
+        return features.compute_features(windows, self.sampling_rate)
+
+    # Features of raw windows of shape (..., window_size, 6)
+
+    def extract_features(self, windows):
+        return features.compute_features(sosfilt(self.sos, windows), self.sampling_rate)
+
+    # Classify a matrix of feature vectors. Returns the labels and their probabilities
+
+    def classify_features(self, feature_matrix):
+        proba = self.classifier.predict_proba(self.scaler.transform(feature_matrix))
+        index = np.argmax(proba, axis=1)
+        return self.labels[self.classifier.classes_[index]], proba[np.arange(len(index)), index]
+
+    def classify(self, feature_vector):
+        labels, confidences = self.classify_features(np.reshape(feature_vector, (1, -1)))
+        return labels[0], float(confidences[0])
+
+    # The live window, kept up to date incrementally like in the Recognizer
+
+    def make_live_window(self):
+        return features.SlidingWindowFeatures(self.window_size, self.sos, self.sampling_rate)
@@ -0,0 +1,257 @@
+import os
+import json
+import time
+import struct
+import argparse
+import threading
+from pathlib import Path
+import numpy as np
+import features
+
+# Logs the timeline of a workout session: for every classified window the features, the class probabilities,
+# the published label with its confidence and the activity the user was asked to do. Records have a fixed size
+# and are appended to binary files, each starting with a json header that describes the records. Like the
+# Recorder, the logger keeps its records in a preallocated ring buffer and a background thread writes them, so
+# logging never waits for the disk. If the writer can't keep up, records are dropped instead of using more
+# memory. A file is closed and the next part of the session started once it reaches MAX_FILE_SIZE.
+# read_records streams the records back in chunks, so a session never has to fit into memory
+
+SESSION_DIR = 'sessions/'
+SUFFIX = '.slog'
+MAGIC = b'SLOG'
+VERSION = 1
+BUFFER_SIZE = 1024          # Number of records the ring buffer can hold before records are dropped
+FLUSH_SIZE = 128            # Number of records that are written to the file at once
+FLUSH_INTERVAL = 1.0        # Seconds after which buffered records are written even if there are less than FLUSH_SIZE
+MAX_FILE_SIZE = 16 * 2**20  # Size in bytes at which a file is closed and the next part is started
+CHUNK_SIZE = 4096           # Number of records read at once
+NO_LABEL = -1               # Label and target of records without a prediction or without an activity
+
+
+# Data type of a record. Labels and targets are indices into the labels in the header
+def make_record_dtype(num_classes, num_features=features.NUM_FEATURES):
+    return np.dtype([
+        ('time', '<f8'),                            # Unix time of the prediction
+        ('label', 'i1'),                            # Published label (the decision if there is a decision filter)
+        ('confidence', '<f4'),
+        ('target', 'i1'),                           # Activity the user was asked to do
+        ('partial', '?'),                           # The window was not full yet
+        ('probabilities', '<f4', (num_classes,)),   # Of this window alone, NaN if they weren't computed
+        ('features', '<f4', (num_features,)),
+    ])
+
+
+class SessionLog:
+
+    def __init__(self, labels, directory=SESSION_DIR, params=None, buffer_size=BUFFER_SIZE, flush_size=FLUSH_SIZE,
+                 max_file_size=MAX_FILE_SIZE):
+        self.labels = list(labels)
+        self.label_indices = {label: i for i, label in enumerate(self.labels)}
+        self.directory = directory
+        self.params = params or {}  # Recognizer parameters, stored in the header
+        self.flush_size = flush_size
+        self.max_file_size = max_file_size
+        self.dtype = make_record_dtype(len(self.labels))
+        self.buffer = np.zeros(buffer_size, dtype=self.dtype)
+        self.target = None          # Activity the user is asked to do, None between activities
+        self.is_logging = False
+        self.session = None
+        self.files = []             # Files of the current or last session
+        self._file = None
+        self._writer_thread = None
+        self._wake_writer = threading.Event()
+        self._reset()
+
+    def _reset(self):
+        # As in the Recorder, only the logging thread advances written and only the writer thread advances
+        # flushed, so the ring buffer needs no lock
+        self.written = 0
+        self.flushed = 0
+        self.dropped = 0
+
+    # Add the record of a classified window. Called by the recognition worker, returns at once
+
+    def log(self, timestamp, feature_vector, probabilities, label, confidence, partial=False):
+        if not self.is_logging:
+            return
+        if self.written - self.flushed >= len(self.buffer):
+            self.dropped += 1
+            return
+        record = self.buffer[self.written % len(self.buffer)]
+        record['time'] = timestamp
+        record['label'] = self.label_indices.get(label, NO_LABEL)
+        record['confidence'] = np.nan if confidence is None else confidence
+        record['target'] = self.label_indices.get(self.target, NO_LABEL)
+        record['partial'] = partial
+        record['probabilities'] = np.nan if probabilities is None else probabilities
+        record['features'] = feature_vector
+        self.written += 1
+        if self.written - self.flushed >= self.flush_size:
+            self._wake_writer.set()
+
+    # Start logging a new session to its own files
+
+    def start(self):
+        if self.is_logging:
+            return
+        self._reset()
+        self.session = time.strftime('%Y%m%d-%H%M%S')
+        self.files = []
+        Path(self.directory).mkdir(parents=True, exist_ok=True)
+        self._open_part()
+        self.is_logging = True
+        self._writer_thread = threading.Thread(target=self._write_loop, daemon=True)
+        self._writer_thread.start()
+
+    # Stop logging, write the remaining records and return statistics about the session
+
+    def stop(self):
+        if not self.is_logging:
+            return None
+        self.is_logging = False
+        self._wake_writer.set()
+        self._writer_thread.join()
+        self._file.close()
+        return self.get_stats()
+
+    def get_stats(self):
+        return {
+            'session': self.session,
+            'records': self.flushed,
+            'dropped': self.dropped,
+            'files': [str(path) for path in self.files],
+        }
+
+    def _open_part(self):
+        if self._file is not None:
+            self._file.close()
+        path = Path(self.directory) / f'session-{self.session}-{len(self.files):03d}{SUFFIX}'
+        header = json.dumps({
+            'version': VERSION,
+            'session': self.session,
+            'part': len(self.files),
+            'labels': self.labels,
+            'feature_names': features.FEATURE_NAMES,
+            'params': self.params,
+            'dtype': self.dtype.descr,
+        }).encode()
+        self._file = open(path, 'wb')
+        self._file.write(MAGIC + struct.pack('<I', len(header)) + header)
+        self._file_records = 0
+        self.files.append(path)
+
+    def _write_loop(self):
+        while self.is_logging:
+            self._wake_writer.wait(FLUSH_INTERVAL)
+            self._wake_writer.clear()
+            self._flush()
+        self._flush()
+
+    # Write all buffered records. The part of the ring buffer may wrap around, then it is written in two pieces
+
+    def _flush(self):
+        end = self.written
+        while self.flushed < end:
+            start_index = self.flushed % len(self.buffer)
+            count = min(end - self.flushed, len(self.buffer) - start_index)
+            if self._file_records and self._file.tell() + count * self.dtype.itemsize > self.max_file_size:
+                self._open_part()
+            self._file.write(self.buffer[start_index:start_index + count].tobytes())
+            self._file_records += count
+            self.flushed += count
+        self._file.flush()
+
+
+# Read the header of a log file. Returns the header and the offset of the first record
+
+def read_header(f):
+    if f.read(len(MAGIC)) != MAGIC:
+        raise ValueError(f"{f.name} is not a session log")
+    length, = struct.unpack('<I', f.read(4))
+    header = json.loads(f.read(length))
+    header['dtype'] = np.dtype([tuple(field) for field in header['dtype']])
+    return header, len(MAGIC) + 4 + length
+
+
+# Read the records of a log file in chunks of at most chunk_size records. Yields (header, records), records is a
+# structured array with the fields of make_record_dtype. An incomplete last record (e.g. of a file that is still
+# being written) is left out
+
+def read_records(path, chunk_size=CHUNK_SIZE):
+    with open(path, 'rb') as f:
+        header, offset = read_header(f)
+        itemsize = header['dtype'].itemsize
+        remaining = (os.path.getsize(path) - offset) // itemsize
+        while remaining > 0:
+            count = min(chunk_size, remaining)
+            yield header, np.frombuffer(f.read(count * itemsize), dtype=header['dtype'])
+            remaining -= count
+
+
+# Get the log files in the given files and directories, grouped by session (parts in order)
+
+def get_sessions(paths):
+    files = []
+    for path in map(Path, paths):
+        files.extend(sorted(path.rglob(f'*{SUFFIX}')) if path.is_dir() else [path])
+    sessions = {}
+    for path in files:
+        with open(path, 'rb') as f:
+            header, _ = read_header(f)
+        sessions.setdefault(header['session'], []).append((header['part'], path))
+    return {session: [path for _, path in sorted(parts)] for session, parts in sorted(sessions.items())}
+
+
+# Summarize a session chunk by chunk: duration, how often the published label matched the activity and how
+# often the label changed. Windows of an activity whose own probabilities point to another class are hard cases
+# for the classifier, they are collected as (features, targets) if hard_cases is a list
+
+def summarize_session(files, chunk_size=CHUNK_SIZE, hard_cases=None):
+    summary = {'records': 0, 'with_target': 0, 'correct': 0, 'label_changes': 0, 'hard_cases': 0}
+    first_time = last_time = None
+    last_label = NO_LABEL
+    for path in files:
+        for header, records in read_records(path, chunk_size):
+            if first_time is None:
+                first_time = records['time'][0]
+            last_time = records['time'][-1]
+            summary['records'] += len(records)
+
+            labels = records['label']
+            labelled = labels[labels != NO_LABEL]
+            if len(labelled):
+                summary['label_changes'] += int(np.count_nonzero(np.diff(labelled))) + int(last_label != NO_LABEL and labelled[0] != last_label)
+                last_label = labelled[-1]
+
+            with_target = records[records['target'] != NO_LABEL]
+            summary['with_target'] += len(with_target)
+            summary['correct'] += int(np.count_nonzero(with_target['label'] == with_target['target']))
+            full = with_target[~with_target['partial'] & ~np.isnan(with_target['probabilities']).any(axis=1)]
+            hard = full[np.argmax(full['probabilities'], axis=1) != full['target']]
+            summary['hard_cases'] += len(hard)
+            if hard_cases is not None and len(hard):
+                hard_cases.append((hard['features'], np.array(header['labels'], dtype=object)[hard['target']]))
+    summary['duration_s'] = float(last_time - first_time) if summary['records'] else 0.0
+    summary['accuracy'] = summary['correct'] / summary['with_target'] if summary['with_target'] else None
+    return summary
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Summarize session logs written by the fitness trainer')
+    parser.add_argument('paths', nargs='*', default=[SESSION_DIR], help=f'log files or directories (default: {SESSION_DIR})')
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE, help='number of records read at once')
+    parser.add_argument('--hard-cases', help='write the features and activities of the hard cases to this .npz file')
+    args = parser.parse_args()
+
+    hard_cases = [] if args.hard_cases else None
+    print(f"{'session':<16} {'records':>8} {'duration':>9} {'accuracy':>9} {'changes':>8} {'hard':>6}")
+    for session, files in get_sessions(args.paths).items():
+        summary = summarize_session(files, args.chunk_size, hard_cases)
+        accuracy = '-' if summary['accuracy'] is None else f"{summary['accuracy']:.2%}"
+        print(f"{session:<16} {summary['records']:>8} {summary['duration_s']:>8.1f}s {accuracy:>9} {summary['label_changes']:>8} {summary['hard_cases']:>6}")
+
+    if args.hard_cases:
+        samples = np.concatenate([samples for samples, _ in hard_cases]) if hard_cases else np.empty((0, features.NUM_FEATURES))
+        activities = np.concatenate([activities for _, activities in hard_cases]) if hard_cases else np.empty(0, dtype=object)
+        np.savez(args.hard_cases, features=samples, activities=activities.astype(str))
+        print(f"Wrote {len(samples)} hard cases to {args.hard_cases}")
@@ -0,0 +1,114 @@
+import os
+import sys
+import json
+import time
+import argparse
+import subprocess
+from pathlib import Path
+from benchmark import RESULTS_DIR, get_git_commit
+
+# Measures how long the application takes to start, each step in a fresh process so nothing is imported already:
+# the import of every module in MODULES, broken down by the modules it pulls in (python -X importtime), the time
+# until the recognizer is ready (created and its classifier loaded or trained) and optionally the time until
+# fitness_trainer.py has drawn its first frame (needs a display). Results are written as json to RESULTS_DIR
+
+MODULES = ['activity_recognizer', 'runtime', 'decision', 'pyglet']
+TOP_MODULES = 10    # Number of the slowest modules printed per import
+
+READY_SCRIPT = """
+import json, time
+start_time = time.perf_counter()
+from activity_recognizer import Recognizer
+import_time = time.perf_counter() - start_time
+recognizer = Recognizer(listen=False)
+create_time = time.perf_counter() - start_time
+recognizer.load_or_train_classifier()
+print(json.dumps({'import_s': import_time, 'create_s': create_time, 'ready_s': time.perf_counter() - start_time}))
+"""
+
+
+# Import module in a fresh process with -X importtime. Returns the total time and the modules it imported with their
+# own (self) and cumulative import times, slowest first. Lines look like "import time: self [us] | cumulative | name"
+
+def profile_import(module):
+    stderr = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+                            capture_output=True, text=True, check=True).stderr
+    modules = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        own, cumulative, name = line[len('import time:'):].split('|')
+        modules.append({'module': name.strip(), 'self_ms': int(own) / 1000, 'cumulative_ms': int(cumulative) / 1000})
+    # The requested module is imported last, its cumulative time includes everything it imported
+    total = next((m['cumulative_ms'] for m in reversed(modules) if m['module'] == module), None)
+    return {
+        'total_ms': total,
+        'modules': len(modules),
+        'slowest': sorted(modules, key=lambda m: -m['self_ms'])[:TOP_MODULES],
+    }
+
+
+def profile_ready():
+    output = subprocess.run([sys.executable, '-c', READY_SCRIPT], capture_output=True, text=True, check=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+# Start fitness_trainer.py, which exits after drawing its first frame (see FITNESS_TRAINER_PROFILE_STARTUP there)
+
+def profile_first_frame():
+    start_time = time.perf_counter()
+    subprocess.run([sys.executable, 'fitness_trainer.py'], env={**os.environ, 'FITNESS_TRAINER_PROFILE_STARTUP': '1'},
+                   capture_output=True, check=True)
+    return {'first_frame_s': time.perf_counter() - start_time}
+
+
+# Print the change of the import and ready times compared to an earlier result file
+
+def compare(results, previous_path):
+    with open(previous_path) as f:
+        previous = json.load(f)
+    print(f"\nCompared to {previous_path}:")
+    for module, measurement in results['imports'].items():
+        before = previous['imports'].get(module, {}).get('total_ms')
+        if before and measurement['total_ms']:
+            print(f"  import {module:<20} {before:10.1f} ms -> {measurement['total_ms']:10.1f} ms ({measurement['total_ms'] / before:.2f}x)")
+    for step in ('ready_s', 'first_frame_s'):
+        before, after = previous.get('startup', {}).get(step), results['startup'].get(step)
+        if before and after:
+            print(f"  {step:<27} {before * 1000:10.1f} ms -> {after * 1000:10.1f} ms ({after / before:.2f}x)")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Profile the startup time of the recognizer and the fitness trainer')
+    parser.add_argument('--modules', nargs='+', default=MODULES, help=f"modules whose import is profiled (default: {', '.join(MODULES)})")
+    parser.add_argument('--first-frame', action='store_true', help='also measure the time until the fitness trainer shows its first frame (needs a display)')
+    parser.add_argument('--output', help=f'result file (default: {RESULTS_DIR}startup-<time>.json)')
+    parser.add_argument('--compare', help='earlier result file to compare with')
+    args = parser.parse_args()
+
+    results = {
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'commit': get_git_commit(),
+        'python': sys.version.split()[0],
+        'imports': {},
+    }
+    for module in args.modules:
+        measurement = profile_import(module)
+        results['imports'][module] = measurement
+        print(f"import {module}: {measurement['total_ms']:.1f} ms ({measurement['modules']} modules), slowest:")
+        for m in measurement['slowest']:
+            print(f"  {m['self_ms']:8.1f} ms  {m['module']}")
+
+    results['startup'] = profile_ready()
+    if args.first_frame:
+        results['startup'].update(profile_first_frame())
+    print("Recognizer: " + ', '.join(f"{step} {seconds * 1000:.1f} ms" for step, seconds in results['startup'].items()))
+
+    output = args.output or f"{RESULTS_DIR}startup-{time.strftime('%Y%m%d-%H%M%S')}.json"
+    Path(output).parent.mkdir(parents=True, exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"Results written to {output}")
+
+    if args.compare:
+        compare(results, args.compare)
@@ -0,0 +1,44 @@
+import sys
+from pathlib import Path
+
+# The modules live in the repository root, not in a package
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import numpy as np
+import pytest
+import recordings
+from utils import LABEL_DICT
+
+RATE = 100
+PARTICIPANTS = ['anna', 'ben', 'carl']
+
+
+# The Recognizer reads its parameters and models from models/ relative to the working directory. Every test gets
+# its own empty models directory, so what a test exercises doesn't depend on the files in the checkout
+
+@pytest.fixture(autouse=True)
+def model_dir(tmp_path, monkeypatch):
+    import activity_recognizer
+    directory = tmp_path / 'models'
+    for name, file in (('MODEL_PATH', 'recognizer.joblib'), ('FEATURE_CACHE_PATH', 'feature_cache.joblib'),
+                       ('PARAMS_PATH', 'params.json'), ('RUNTIME_PATH', 'recognizer_runtime.npz')):
+        monkeypatch.setattr(activity_recognizer, name, str(directory / file))
+    return directory
+
+
+# Synthetic recordings in the data/ layout: every activity moves at its own frequency, every participant a little
+# differently. Returns the directory
+
+@pytest.fixture
+def recording_dir(tmp_path):
+    rng = np.random.default_rng(0)
+    directory = tmp_path / 'data'
+    t = np.arange(300) / RATE
+    for activity, label in LABEL_DICT.items():
+        (directory / activity).mkdir(parents=True)
+        for p, participant in enumerate(PARTICIPANTS):
+            for n in range(2):
+                frequency = 0.5 + label + 0.1 * p
+                channels = np.sin(2 * np.pi * frequency * t)[:, None] * np.arange(1, 7) + rng.normal(0, 0.1, (len(t), 6))
+                recordings.save_recording(directory / activity / f'{participant}-{activity}-{n + 1}.csv', t * 1000, channels)
+    return directory
@@ -0,0 +1,58 @@
+import os
+import numpy as np
+import recordings
+from dataset_index import DatasetIndex
+
+
+def add_recording(directory, name, rows=300, seed=0):
+    activity = name.split('-')[1]
+    path = directory / activity / f'{name}.csv'
+    path.parent.mkdir(parents=True, exist_ok=True)
+    channels = np.random.default_rng(seed).normal(size=(rows, 6))
+    recordings.save_recording(path, np.arange(rows) * 10, channels)
+    return path
+
+
+def test_update_only_indexes_changed_files(recording_dir, tmp_path):
+    index = DatasetIndex(tmp_path / 'index.json')
+    assert len(index.update(recording_dir)) == 24
+    index.save()
+
+    # A new index loads the entries and doesn't need to read any file again
+    index = DatasetIndex(tmp_path / 'index.json')
+    assert index.update(recording_dir) == [] and not index.changed
+
+    added = add_recording(recording_dir, 'dora-running-1')
+    assert index.update(recording_dir) == [added.as_posix()]
+
+    changed = recording_dir / 'rowing' / 'anna-rowing-1.csv'
+    add_recording(recording_dir, 'anna-rowing-1', rows=400, seed=1)
+    stat = os.stat(changed)
+    os.utime(changed, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    assert index.update(recording_dir) == [changed.as_posix()]
+    assert index.entries[changed.as_posix()]['rows'] == 400
+
+    deleted = recording_dir / 'lifting' / 'ben-lifting-2.csv'
+    deleted.unlink()
+    assert index.update(recording_dir) == []
+    assert deleted.as_posix() not in index.entries and len(index.entries) == 24
+
+
+def test_select_by_participant_and_activity(recording_dir, tmp_path):
+    index = DatasetIndex(tmp_path / 'index.json')
+    index.update(recording_dir)
+    selected = index.select(recording_dir, participants=['anna', 'carl'], activities=['running'])
+    assert [path.name for path in selected] == ['anna-running-1.csv', 'anna-running-2.csv', 'carl-running-1.csv', 'carl-running-2.csv']
+    assert len(index.select(recording_dir)) == 24
+
+
+def test_select_skips_short_recordings_and_duplicates(recording_dir, tmp_path):
+    short = add_recording(recording_dir, 'dora-running-1', rows=50)
+    (recording_dir / 'running' / 'dora-running-2.csv').write_bytes((recording_dir / 'running' / 'anna-running-1.csv').read_bytes())
+    index = DatasetIndex(tmp_path / 'index.json')
+    index.update(recording_dir)
+    assert index.get_rejections(short.as_posix()) == ['only 0.5 s long']
+    assert index.get_duplicates() == [[(recording_dir / 'running' / name).as_posix() for name in ('anna-running-1.csv', 'dora-running-2.csv')]]
+    # Of the duplicates only the first one is selected
+    selected = [path.name for path in index.select(recording_dir)]
+    assert len(selected) == 24 and 'anna-running-1.csv' in selected and not any(name.startswith('dora') for name in selected)
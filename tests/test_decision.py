@@ -0,0 +1,42 @@
+from decision import DecisionFilter
+
+LABELS = ['running', 'rowing', 'jumpingjack']
+
+
+def test_hysteresis_holds_the_label_until_the_margin_is_exceeded():
+    decision_filter = DecisionFilter(LABELS, smoothing_time=0, switch_margin=0.2)
+    assert decision_filter.update([0.7, 0.2, 0.1], 0.0) == 'running'
+    # rowing is more probable, but not by the margin
+    assert decision_filter.update([0.4, 0.5, 0.1], 0.1) == 'running'
+    assert decision_filter.confidence == 0.4
+    assert decision_filter.update([0.3, 0.6, 0.1], 0.2) == 'rowing'
+    assert decision_filter.changes == 1
+
+
+def test_smoothing_delays_the_switch():
+    decision_filter = DecisionFilter(LABELS, smoothing_time=0.5, switch_margin=0.2)
+    decision_filter.update([1.0, 0.0, 0.0], 0.0)
+    timestamp = 0.0
+    while decision_filter.update([0.0, 1.0, 0.0], timestamp + 0.05) == 'running':
+        timestamp += 0.05
+    # The smoothed probability of rowing has to be 0.2 higher: 1 - 2 * exp(-t / 0.5) >= 0.2 after t >= 0.46 s
+    assert 0.4 <= timestamp + 0.05 <= 0.5
+
+
+def test_early_decisions_need_a_confident_partial_window():
+    decision_filter = DecisionFilter(LABELS, early_confidence=0.9)
+    assert decision_filter.update([0.8, 0.1, 0.1], 0.0, partial=True) is None
+    assert decision_filter.update([0.05, 0.05, 0.9], 0.1, partial=True) == 'jumpingjack'
+    # Once a full window was classified, partial windows don't change the decision anymore
+    decision_filter.update([0.1, 0.1, 0.8], 0.2)
+    assert decision_filter.update([0.95, 0.05, 0.0], 0.3, partial=True) == 'jumpingjack'
+
+
+def test_reset_forgets_the_decision():
+    decision_filter = DecisionFilter(LABELS, smoothing_time=0)
+    decision_filter.update([0.7, 0.2, 0.1], 0.0)
+    decision_filter.update([0.1, 0.8, 0.1], 0.1)
+    decision_filter.reset()
+    assert decision_filter.label is None and decision_filter.probabilities is None and decision_filter.changes == 0
+    # Without the old decision the next window decides on its own, without a margin
+    assert decision_filter.update([0.3, 0.3, 0.4], 1.0) == 'jumpingjack'
@@ -0,0 +1,63 @@
+import numpy as np
+import features
+
+RATE = 100
+SIZE = 50
+
+
+def make_data(num_samples, seed=0):
+    rng = np.random.default_rng(seed)
+    t = np.arange(num_samples) / RATE
+    return np.sin(2 * np.pi * np.outer(t, np.arange(1, 7))) + rng.normal(scale=0.3, size=(num_samples, 6))
+
+
+# Push data into the window and get the features after every sample once the window is full
+
+def push_all(window, data):
+    vectors = []
+    for sample in data:
+        window.push(sample)
+        if window.is_full():
+            vectors.append(window.get_features())
+    return np.array(vectors)
+
+
+def test_sliding_window_matches_window_features():
+    sos = features.make_filter(4, 8, RATE)
+    data = make_data(5 * SIZE + 17)
+    window = features.SlidingWindowFeatures(SIZE, sos, RATE)
+    # Several windows long, so the running sums and the spectrum are resynced in between
+    np.testing.assert_allclose(push_all(window, data), features.window_features(data, sos, RATE, SIZE), atol=1e-9)
+
+
+def test_resync_keeps_the_features():
+    sos = features.make_filter(2, 10, RATE)
+    data = make_data(3 * SIZE)
+    window = features.SlidingWindowFeatures(SIZE, sos, RATE)
+    push_all(window, data[:SIZE + 23])
+    before = window.get_features()
+    window.resync()
+    np.testing.assert_allclose(window.get_features(), before, atol=1e-9)
+    # The updates after a resync in the middle of a window still agree with the whole recording
+    np.testing.assert_allclose(push_all(window, data[SIZE + 23:]),
+                               features.window_features(data, sos, RATE, SIZE)[24:], atol=1e-9)
+
+
+def test_reset_starts_like_a_new_recording():
+    sos = features.make_filter(4, 8, RATE)
+    data = make_data(2 * SIZE)
+    window = features.SlidingWindowFeatures(SIZE, sos, RATE)
+    push_all(window, make_data(SIZE + 5, seed=1))
+    window.reset()
+    np.testing.assert_allclose(push_all(window, data), features.window_features(data, sos, RATE, SIZE), atol=1e-9)
+
+
+def test_partial_features_match_extract_features():
+    sos = features.make_filter(4, 8, RATE)
+    data = make_data(SIZE)
+    window = features.SlidingWindowFeatures(SIZE, sos, RATE)
+    window.push(data[0])
+    assert window.get_partial_features() is None
+    for count in range(2, SIZE):
+        window.push(data[count - 1])
+        np.testing.assert_allclose(window.get_partial_features(), features.extract_features(data[:count], sos, RATE), atol=1e-9)
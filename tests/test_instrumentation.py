@@ -0,0 +1,16 @@
+import numpy as np
+import instrumentation
+from instrumentation import metrics
+from activity_recognizer import Recognizer
+
+
+def test_live_window_stages_are_measured():
+    metrics.reset()
+    recognizer = Recognizer(listen=False)
+    instrumentation.instrument_recognizer(recognizer)
+    recognizer.live_resampler = None
+    data = np.random.default_rng(0).normal(size=(recognizer.window_size, 6))
+    recognizer.get_live_data = lambda: [(i, sample) for i, sample in enumerate(data)]
+    assert recognizer.update_live_window() is not None
+    assert metrics.get_histogram('live_window.push').count == recognizer.window_size
+    assert metrics.get_histogram('live_window.get_features').count == 1
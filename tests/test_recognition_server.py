@@ -0,0 +1,46 @@
+import json
+import time
+import socket
+import pytest
+from activity_recognizer import Recognizer
+from recognition_server import RecognitionServer, encode_datagram
+
+SAMPLE = [0.1, 0.2, 0.3, 0.4, 0.5, 0.6]
+ADDR = ('127.0.0.1', 5000)
+
+
+@pytest.fixture
+def server():
+    server = RecognitionServer(Recognizer(listen=False), port=0, ip='127.0.0.1')
+    yield server
+    server.stop()
+
+
+def test_bad_datagrams_are_dropped(server):
+    bad_values = {'accelerometer': {'x': 'a', 'y': 0, 'z': 0}, 'gyroscope': {'x': 0, 'y': 0, 'z': 0}}
+    for data in (b'not json', b'[1, 2]', json.dumps(bad_values).encode()):
+        server._handle_datagram(data, ADDR, 1.0)
+    assert server.dropped == 3
+    assert server.datagrams == 0 and not server.devices
+
+
+def test_invalid_device_ids_fall_back_to_the_sender(server):
+    server._handle_datagram(encode_datagram(SAMPLE, device_id=[1]), ADDR, 1.0)
+    server._handle_datagram(encode_datagram(SAMPLE, device_id=7), ADDR, 1.0)
+    assert set(server.devices) == {'127.0.0.1:5000', 7}
+    assert server.datagrams == 2 and server.dropped == 0
+
+
+def test_receiving_continues_after_a_bad_datagram(server):
+    server.start()
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    address = server._sock.getsockname()
+    sock.sendto(encode_datagram(SAMPLE, device_id={'a': 1}), address)
+    sock.sendto(b'{"accelerometer": {"x": "a"}}', address)
+    sock.sendto(encode_datagram(SAMPLE, device_id='phone'), address)
+    sock.close()
+    deadline = time.monotonic() + 2
+    while 'phone' not in server.devices and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert 'phone' in server.devices
+    assert server.dropped == 1
@@ -0,0 +1,50 @@
+import pandas as pd
+from DIPPID import Sensor
+from recorder import Recorder
+
+RATE = 100
+MESSAGES = 300
+
+
+def record(tmp_path, messages):
+    sensor = Sensor()
+    try:
+        recorder = Recorder(sensor, tmp_path / 'recording.csv')
+        recorder.start()
+        for timestamp, message in messages:
+            sensor._update_json(message, timestamp)
+        stats = recorder.stop()
+    finally:
+        Sensor.instances.remove(sensor)
+    return stats, pd.read_csv(tmp_path / 'recording.csv')
+
+
+def test_repeated_values_are_recorded(tmp_path):
+    # A device lying still sends the same values again and again, every message has to become a sample
+    value = {'x': 0.1, 'y': 0.2, 'z': 9.8}
+    start = 1000.0
+    messages = [(start + i / RATE, {'accelerometer': value, 'gyroscope': value}) for i in range(MESSAGES)]
+    stats, df = record(tmp_path, messages)
+
+    assert stats['samples'] == MESSAGES
+    assert stats['dropped'] == 0
+    assert stats['gaps'] == 0
+    assert not df.isna().any().any()
+    assert abs(len(df) - MESSAGES) <= 1
+
+
+def test_split_messages_count_as_dropped(tmp_path):
+    # Accelerometer and gyroscope in separate messages are merged into one sample, a replaced value is lost
+    value = {'x': 1, 'y': 2, 'z': 3}
+    messages = [
+        (0.00, {'accelerometer': value}),
+        (0.01, {'gyroscope': value}),       # merged with the accelerometer value
+        (0.02, {'accelerometer': value}),
+        (0.03, {'accelerometer': value}),   # replaces the previous one
+        (0.04, {'gyroscope': value}),       # merged
+        (0.05, {'accelerometer': value, 'gyroscope': value}),
+    ]
+    stats, _ = record(tmp_path, messages)
+
+    assert stats['samples'] == 3
+    assert stats['dropped'] == 3
@@ -0,0 +1,97 @@
+import numpy as np
+import pandas as pd
+from resampler import StreamResampler
+from activity_recognizer import Recognizer
+
+RATE = 100
+
+
+def push_all(resampler, timestamps, values):
+    bins = []
+    for timestamp, value in zip(timestamps, values):
+        bins += resampler.push(timestamp, value)
+    return bins
+
+
+# Resample like resample.py did before the StreamResampler: bins of 10 ms with the mean of their samples
+
+def pandas_resample(timestamps, values):
+    df = pd.DataFrame(values, index=pd.to_datetime(timestamps, unit='s'))
+    return df.resample('10ms').mean()
+
+
+def samples_with_gaps(num_bins, gaps, seed=0):
+    # One sample per bin, the timestamps are kept off the bin edges where float and datetime rounding could disagree
+    rng = np.random.default_rng(seed)
+    bins = np.arange(num_bins)
+    for start, length in gaps:
+        bins = bins[(bins < start) | (bins >= start + length)]
+    timestamps = (bins * 10 + rng.uniform(1, 9, len(bins))) / 1000
+    return timestamps, rng.normal(size=(len(bins), 3))
+
+
+def test_mean_matches_pandas_resample():
+    rng = np.random.default_rng(0)
+    # Several samples per bin and bins without samples
+    timestamps = np.sort(rng.choice(np.arange(5000) + 0.5, size=800, replace=False)) / 1000
+    values = rng.normal(size=(len(timestamps), 3))
+    resampler = StreamResampler(RATE, num_channels=3)
+    bins = push_all(resampler, timestamps, values) + resampler.flush()
+
+    expected = pandas_resample(timestamps, values)
+    assert len(bins) == len(expected)
+    np.testing.assert_allclose([t for t, _ in bins], expected.index.astype('int64') / 1e9)
+    np.testing.assert_allclose([v for _, v in bins], expected.to_numpy())
+
+
+def test_linear_matches_pandas_interpolate_except_long_gaps():
+    # With one sample per bin, interpolating towards the new sample is the same as towards its bin
+    timestamps, values = samples_with_gaps(2000, gaps=[(100, 3), (400, 20), (700, 50), (1500, 200)])
+    resampler = StreamResampler(RATE, num_channels=3, method='linear', max_gap=20)
+    bins = push_all(resampler, timestamps, values) + resampler.flush()
+
+    expected = pandas_resample(timestamps, values).interpolate()
+    expected.index = np.round(expected.index.astype('int64') / 1e7).astype(int)
+    # The two long gaps are marked by one NaN bin each instead of being interpolated
+    gap_bins = [round(t * RATE) for t, v in bins if np.isnan(v).any()]
+    assert gap_bins == [700, 1500]
+    emitted = {round(t * RATE): v for t, v in bins if not np.isnan(v).any()}
+    assert sorted(emitted) == [b for b in expected.index if not 700 <= b < 750 and not 1500 <= b < 1700]
+    np.testing.assert_allclose(list(emitted.values()), expected.loc[list(emitted)].to_numpy())
+
+
+def test_short_gaps_are_interpolated():
+    resampler = StreamResampler(RATE, num_channels=1, method='linear', max_gap=10)
+    bins = push_all(resampler, [0.005, 0.055], [[0.0], [5.0]])
+    assert [round(t * RATE) for t, _ in bins] == [0, 1, 2, 3, 4]
+    np.testing.assert_allclose([v[0] for _, v in bins], [0, 1, 2, 3, 4])
+
+
+def test_long_gaps_are_marked_with_nan():
+    resampler = StreamResampler(RATE, num_channels=1, method='linear', max_gap=10)
+    bins = push_all(resampler, [0.005, 5.005, 5.015], [[0.0], [5.0], [6.0]])
+    # The finished bin before the pause, one NaN bin for the pause, then the data after it
+    assert len(bins) == 3
+    assert bins[0][1][0] == 0
+    assert np.isnan(bins[1][1][0])
+    assert round(bins[2][0] * RATE) == 500 and bins[2][1][0] == 5
+
+
+def test_live_window_starts_over_after_a_pause():
+    recognizer = Recognizer(listen=False)
+    data = [(i / RATE, np.full(6, float(i))) for i in range(recognizer.window_size + 5)]
+    pause = [(100 + i / RATE, np.ones(6)) for i in range(10)]
+    recognizer.get_live_data = lambda: data + pause
+    recognizer.update_live_window()
+    # The window only holds the samples after the pause (the last one is still in the resampler's bin)
+    assert recognizer.live_window.count == len(pause) - 1
+
+
+def test_reset_live_data_resets_the_resampler():
+    recognizer = Recognizer(listen=False)
+    recognizer.live_resampler.push(0.005, np.zeros(6))
+    recognizer.live_resampler.push(0.015, np.ones(6))
+    recognizer.reset_live_data()
+    assert recognizer.live_resampler.current_bin is None
+    assert recognizer.live_resampler.last_value is None
+    assert recognizer.live_window.count == 0
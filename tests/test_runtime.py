@@ -0,0 +1,93 @@
+import sys
+import json
+import subprocess
+from pathlib import Path
+import numpy as np
+import pytest
+import dataset_index
+import model_store
+import runtime
+import activity_recognizer
+from activity_recognizer import Recognizer
+
+ROOT = Path(__file__).resolve().parent.parent
+
+# Loads the compiled model in a fresh process (with the model paths of the test) and classifies a live window.
+# Prints which heavy modules were imported
+RUNTIME_SCRIPT = """
+import sys, json
+import numpy as np
+import activity_recognizer
+for name, path in json.loads(sys.argv[1]).items():
+    setattr(activity_recognizer, name, path)
+recognizer = activity_recognizer.Recognizer(listen=False)
+recognizer.get_training_files = lambda: json.loads(sys.argv[2])
+recognizer.load_or_train_classifier()
+for sample in np.random.default_rng(0).normal(size=(recognizer.window_size, 6)):
+    recognizer.live_window.push(sample)
+recognizer.get_probabilities(recognizer.live_window.get_features())
+print(json.dumps({module: module in sys.modules for module in ('scipy', 'sklearn', 'pandas')}))
+"""
+
+
+# Train a recognizer on the synthetic recordings and compile it. Returns the recognizer, its files and the path
+# of the compiled model
+
+@pytest.fixture
+def compiled_model(recording_dir, tmp_path):
+    import export_runtime
+    recognizer = Recognizer(listen=False)
+    recognizer.use_runtime = False
+    files = [str(csv) for csv in dataset_index.select_files(recording_dir, tmp_path / 'index.json')]
+    recognizer.train_classifier(files)
+    fingerprint = model_store.get_fingerprint(files, recognizer.get_model_params())
+    path = Path(activity_recognizer.RUNTIME_PATH)
+    export_runtime.export(recognizer, path, fingerprint, recognizer.load_training_data(files).samples)
+    return recognizer, files, path
+
+
+def test_runtime_path_does_not_import_scipy(compiled_model):
+    _, files, _ = compiled_model
+    paths = {name: getattr(activity_recognizer, name) for name in ('MODEL_PATH', 'FEATURE_CACHE_PATH', 'PARAMS_PATH', 'RUNTIME_PATH')}
+    output = subprocess.run([sys.executable, '-c', RUNTIME_SCRIPT, json.dumps(paths), json.dumps(files)],
+                            cwd=ROOT, capture_output=True, text=True, check=True).stdout
+    assert 'Loaded compiled classifier.' in output
+    assert json.loads(output.strip().splitlines()[-1]) == {'scipy': False, 'sklearn': False, 'pandas': False}
+
+
+def test_quantize_round_trip():
+    array = np.random.default_rng(0).normal(size=(4, 100)) * [[1], [10], [1e-3], [0]]
+    quantized, scale = runtime.quantize(array)
+    assert quantized.dtype == np.int8 and scale.shape == (4, 1)
+    restored = runtime.dequantize(quantized, scale)
+    # Every value is off by at most half a step of its row, the row of zeros stays zero
+    assert np.all(np.abs(restored - array) <= scale / 2 + 1e-6 * np.abs(array))
+    assert np.all(restored[3] == 0)
+    assert np.abs(quantized).max() == 127
+
+
+def test_load_model_predicts_like_scikit_learn(compiled_model):
+    import export_runtime
+    recognizer, files, path = compiled_model
+    fingerprint = model_store.get_fingerprint(files, recognizer.get_model_params())
+    meta, scaler, classifier = runtime.load_model(path, fingerprint)
+    samples = recognizer.load_training_data(files).samples
+    reference = recognizer.predict_scores(recognizer.scale(samples))
+    proba = classifier.predict_proba(scaler.transform(samples))
+    # The quantized arrays were only kept if they don't change the predictions (see export_runtime.export)
+    assert np.mean(np.argmax(proba, axis=1) == np.argmax(reference, axis=1)) >= export_runtime.MIN_AGREEMENT
+    assert np.abs(proba - reference).max() <= export_runtime.MAX_PROBABILITY_DIFF
+    np.testing.assert_array_equal(classifier.classes_, recognizer.classifier.classes_)
+
+
+def test_load_model_rejects_other_fingerprints(compiled_model, tmp_path):
+    _, _, path = compiled_model
+    assert runtime.load_model(path, 'other') is None
+    assert runtime.load_model(tmp_path / 'missing.npz') is None
+
+
+def test_load_filter_only_returns_the_filter_of_the_same_parameters(compiled_model):
+    recognizer, _, path = compiled_model
+    params = (recognizer.order, recognizer.cutoff_frequency, recognizer.sampling_rate)
+    np.testing.assert_allclose(runtime.load_filter(path, *params), recognizer.butter_filter)
+    assert runtime.load_filter(path, recognizer.order + 1, *params[1:]) is None
@@ -0,0 +1,64 @@
+import time
+import numpy as np
+import features
+import session_log
+from session_log import SessionLog, NO_LABEL
+
+LABELS = ['running', 'rowing', 'jumpingjack', 'lifting']
+
+
+def log_records(log, count, start=0):
+    rng = np.random.default_rng(start)
+    for i in range(start, start + count):
+        log.target = LABELS[i % 2]
+        log.log(1000.0 + i, rng.normal(size=features.NUM_FEATURES), np.full(len(LABELS), 0.25), LABELS[0], 0.5 + i / 1000)
+
+
+def read_all(files):
+    return np.concatenate([records for path in files for _, records in session_log.read_records(path, chunk_size=7)])
+
+
+def test_records_round_trip(tmp_path):
+    log = SessionLog(LABELS, tmp_path, params={'window_size': 50})
+    log.start()
+    log_records(log, 100)
+    log.log(1100.0, np.zeros(features.NUM_FEATURES), None, None, None, partial=True)
+    stats = log.stop()
+    assert stats['records'] == 101 and stats['dropped'] == 0 and len(stats['files']) == 1
+
+    with open(stats['files'][0], 'rb') as f:
+        header, _ = session_log.read_header(f)
+    assert header['labels'] == LABELS and header['params'] == {'window_size': 50}
+    records = read_all(log.files)
+    np.testing.assert_array_equal(records['time'], 1000.0 + np.arange(101))
+    np.testing.assert_array_equal(records['target'][:4], [0, 1, 0, 1])
+    assert records['label'][-1] == NO_LABEL and records['partial'][-1] and np.isnan(records['probabilities'][-1]).all()
+    summary = session_log.summarize_session(log.files)
+    assert summary['records'] == 101 and summary['with_target'] == 101 and summary['correct'] == 50
+
+
+def test_session_is_split_into_parts(tmp_path):
+    itemsize = session_log.make_record_dtype(len(LABELS)).itemsize
+    log = SessionLog(LABELS, tmp_path, flush_size=10, max_file_size=2048 + 20 * itemsize)
+    log.start()
+    for start in range(0, 200, 20):
+        log_records(log, 20, start)
+        # A file is only split between two writes, wait until the writer got the records
+        deadline = time.monotonic() + 5
+        while log.flushed < log.written and time.monotonic() < deadline:
+            time.sleep(0.001)
+    stats = log.stop()
+    assert len(stats['files']) > 1
+    assert list(session_log.get_sessions([tmp_path]).values()) == [log.files]
+    np.testing.assert_array_equal(read_all(log.files)['time'], 1000.0 + np.arange(200))
+
+
+def test_torn_last_record_is_skipped(tmp_path):
+    log = SessionLog(LABELS, tmp_path)
+    log.start()
+    log_records(log, 10)
+    log.stop()
+    # A record that was only partly written when the application stopped
+    with open(log.files[0], 'ab') as f:
+        f.write(b'\0' * (log.dtype.itemsize // 2))
+    assert len(read_all(log.files)) == 10
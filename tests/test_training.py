@@ -0,0 +1,52 @@
+import numpy as np
+import activity_recognizer
+from activity_recognizer import Recognizer
+import dataset_index
+import model_store
+import recordings
+import training
+
+
+def test_set_params_resets_classifier_params():
+    recognizer = Recognizer(listen=False)
+    recognizer.set_params({'classifier': 'forest', 'classifier_params': {'estimator__max_depth': 6}})
+    recognizer.set_params({'classifier': 'linear'})
+    assert recognizer.classifier_params == {}
+    # Must not fail with an invalid parameter of the forest
+    recognizer.create_classifier()
+
+
+def test_search_uses_the_folds_of_the_best_feature_setting(recording_dir, tmp_path, monkeypatch):
+    # Window sizes give different numbers of windows, the report of the best candidate has to use its own folds
+    monkeypatch.setattr(training, 'FEATURE_GRID', {'order': [1], 'cutoff_frequency': [8], 'window_size': [50, 100]})
+    monkeypatch.setattr(training, 'CLASSIFIER_GRID', {'linear': {'estimator__C': [1]}})
+    recognizer = Recognizer(listen=False)
+    files = dataset_index.select_files(recording_dir, tmp_path / 'index.json')
+    report = training.search(recognizer, files, ['linear'], folds=3, n_jobs=1)
+
+    assert len(report['candidates']) == 2
+    matrix = np.array(report['best_confusion_matrix']['matrix'])
+    assert matrix.sum() == report['windows']
+    assert set(report['best_participant_accuracies']) == {'anna', 'ben', 'carl'}
+
+
+def test_feature_cache_keeps_the_files_outside_the_selection(recording_dir, tmp_path, monkeypatch):
+    featurized = []
+    featurize_files = recordings.featurize_files
+    monkeypatch.setattr(recordings, 'featurize_files', lambda files, *args: featurized.extend(files) or featurize_files(files, *args))
+    recognizer = Recognizer(listen=False)
+    index_path = tmp_path / 'index.json'
+    files = dataset_index.select_files(recording_dir, index_path)
+    recognizer.load_training_data(files)
+    assert len(featurized) == len(files)
+
+    recognizer.load_training_data(dataset_index.select_files(recording_dir, index_path, participants=['anna']))
+    featurized.clear()
+    recognizer.load_training_data(files)
+    assert featurized == []
+
+    # Only the entries of deleted files are evicted
+    files[0].unlink()
+    recognizer.load_training_data(files[1:])
+    cache = model_store.FeatureCache(activity_recognizer.FEATURE_CACHE_PATH)
+    assert set(cache.entries) == {csv.as_posix() for csv in files[1:]}
@@ -0,0 +1,180 @@
+import json
+import time
+import argparse
+from itertools import product
+from pathlib import Path
+import numpy as np
+from joblib import Parallel, delayed
+from sklearn.preprocessing import StandardScaler
+from sklearn import model_selection, metrics
+import classifiers
+import model_store
+import dataset_index
+from activity_recognizer import Recognizer, TRAINING_SEED, WINDOW_STRIDE, CLASS_LABELS
+from utils import MODEL_PATH, PARAMS_PATH
+
+# Searches the filter, window and classifier parameters with cross-validation grouped by participant: the recordings of
+# one participant are never in the training and the test data of the same fold, so the accuracy tells how well
+# the recognizer works for people it hasn't seen. The features of every filter and window setting are extracted
+# once (and cached per file), the candidates are then evaluated in parallel by joblib workers. To keep the search
+# fast, its training windows start every SEARCH_STRIDE samples, the final model uses the recognizer's stride.
+# The best parameters are saved to PARAMS_PATH, where the Recognizer picks them up, and a classifier trained
+# with them on all selected recordings (see dataset_index.py) is saved as the model. A report with the results is written to REPORT_PATH
+
+REPORT_PATH = 'models/training_report.json'
+FOLDS = 5   # Number of cross-validation folds (at most the number of participants)
+SEARCH_STRIDE = 25  # Number of samples between the starts of two training windows during the search
+
+# Values tried by the search. Every feature setting is combined with every classifier setting
+FEATURE_GRID = {
+    'order': [1, 2, 4],
+    'cutoff_frequency': [2, 3, 5, 8],
+    'window_size': [50, 100],
+}
+CLASSIFIER_GRID = {
+    'linear': {'estimator__C': [0.1, 1, 10]},
+    'nystroem': {'estimator__nystroem__gamma': [0.01, 0.03, 0.1], 'estimator__linearsvc__C': [1, 10]},
+    'forest': {'estimator__max_depth': [6, 12, None]},
+    'svc': {'estimator__C': [0.1, 1, 10], 'estimator__degree': [2, 3]},
+}
+
+
+# Get every combination of the values in grid as a list of dicts
+
+def expand_grid(grid):
+    return [dict(zip(grid, values)) for values in product(*grid.values())]
+
+
+# Train and test one candidate on every fold. Returns the accuracy of every fold and the predictions
+# for all samples, each made by the classifier of the fold the sample was tested in
+
+def evaluate_candidate(samples, classes, folds, classifier_name, classifier_params, seed):
+    accuracies = []
+    pred = np.empty_like(classes)
+    for train_index, test_index in folds:
+        scaler = StandardScaler().fit(samples[train_index])
+        classifier = classifiers.make_classifier(classifier_name, seed).set_params(**classifier_params)
+        classifier.fit(scaler.transform(samples[train_index]), classes[train_index])
+        pred[test_index] = classifier.predict(scaler.transform(samples[test_index]))
+        accuracies.append(metrics.accuracy_score(classes[test_index], pred[test_index]))
+    return accuracies, pred
+
+
+# Run the search on files. Returns the report as a dict, report['best'] holds the best parameters
+
+def search(recognizer, files, classifier_names=classifiers.CLASSIFIERS, folds=FOLDS, n_jobs=-1, seed=TRAINING_SEED):
+    start_time = time.perf_counter()
+    feature_settings = expand_grid(FEATURE_GRID)
+    data = []
+    fold_indices = []
+    for feature_params in feature_settings:
+        recognizer.set_params({**feature_params, 'window_stride': SEARCH_STRIDE})
+        training_data = recognizer.load_training_data(files)
+        data.append(training_data)
+        # The number of windows depends on the window size, so every setting gets its own folds
+        splitter = model_selection.GroupKFold(n_splits=min(folds, len(set(training_data.groups))))
+        fold_indices.append(list(splitter.split(training_data.samples, training_data.classes, training_data.groups)))
+    feature_time = time.perf_counter() - start_time
+
+    candidates = []
+    feature_indices = []    # Index of the feature setting of every candidate
+    for feature_index, feature_params in enumerate(feature_settings):
+        for name in classifier_names:
+            for classifier_params in expand_grid(CLASSIFIER_GRID[name]):
+                candidates.append({**feature_params, 'classifier': name, 'classifier_params': classifier_params})
+                feature_indices.append(feature_index)
+    results = Parallel(n_jobs=n_jobs)(
+        delayed(evaluate_candidate)(data[i].samples, data[i].classes, fold_indices[i], candidate['classifier'], candidate['classifier_params'], seed)
+        for candidate, i in zip(candidates, feature_indices))
+
+    # The best candidate has the highest mean accuracy. On a tie, the one that comes first in the grids wins
+    mean_accuracies = [np.mean(accuracies) for accuracies, _ in results]
+    best_index = int(np.argmax(mean_accuracies))
+    best_accuracies, best_pred = results[best_index]
+    best_feature_index = feature_indices[best_index]
+    _, classes, groups, _ = data[best_feature_index]
+    participants = sorted(set(groups))
+    labels = list(CLASS_LABELS)
+
+    return {
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'seed': seed,
+        'files': len(files),
+        'search_stride': SEARCH_STRIDE,
+        'windows': len(classes),
+        'participants': participants,
+        'folds': len(fold_indices[best_feature_index]),
+        'feature_s': feature_time,
+        'search_s': time.perf_counter() - start_time,
+        'best': candidates[best_index],
+        'best_accuracy': mean_accuracies[best_index],
+        'best_fold_accuracies': best_accuracies,
+        'best_participant_accuracies': {
+            participant: metrics.accuracy_score(classes[groups == participant], best_pred[groups == participant])
+            for participant in participants
+        },
+        'best_confusion_matrix': {
+            'labels': labels,
+            'matrix': metrics.confusion_matrix(classes, best_pred, labels=range(len(labels))).tolist(),
+        },
+        'candidates': sorted(
+            ({**candidate, 'accuracy': float(np.mean(accuracies)), 'accuracy_std': float(np.std(accuracies))}
+             for candidate, (accuracies, _) in zip(candidates, results)),
+            key=lambda result: -result['accuracy']),
+    }
+
+
+# Configure the recognizer with params, train it on all files and save the model and the parameters
+
+def train_and_save(recognizer, files, params):
+    recognizer.set_params({**params, 'window_stride': WINDOW_STRIDE})
+    samples, classes, _, _ = recognizer.load_training_data(files)
+    recognizer.scaler = StandardScaler().fit(samples)
+    recognizer.classifier = recognizer.create_classifier().fit(recognizer.scaler.transform(samples), classes)
+    recognizer.finished_training = True
+    fingerprint = model_store.get_fingerprint(files, recognizer.get_model_params())
+    model_store.save_model(MODEL_PATH, recognizer.scaler, recognizer.classifier, fingerprint)
+
+    Path(PARAMS_PATH).parent.mkdir(parents=True, exist_ok=True)
+    with open(PARAMS_PATH, 'w') as f:
+        json.dump(params, f, indent=2)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Search the best filter, window and classifier parameters with cross-validation grouped by participant')
+    parser.add_argument('--classifiers', nargs='+', default=classifiers.CLASSIFIERS, help=f"classifiers to search (default: all of {', '.join(classifiers.CLASSIFIERS)})")
+    parser.add_argument('--folds', type=int, default=FOLDS, help='number of cross-validation folds')
+    parser.add_argument('--jobs', type=int, default=-1, help='number of joblib workers (-1: one per core)')
+    parser.add_argument('--report', default=REPORT_PATH, help='file the report is written to')
+    parser.add_argument('--no-save', action='store_true', help='only write the report, keep the current model and parameters')
+    parser.add_argument('--participants', nargs='+', help='only train on the recordings of these participants')
+    parser.add_argument('--activities', nargs='+', help='only train on the recordings of these activities')
+    parser.add_argument('--max-nan-ratio', type=float, help=f'highest ratio of rows with missing values (default: {dataset_index.MAX_NAN_RATIO})')
+    parser.add_argument('--min-duration', type=float, help=f'shortest recording in seconds (default: {dataset_index.MIN_DURATION})')
+    parser.add_argument('--min-sample-rate', type=float, help='lowest effective sampling rate in Hz')
+    args = parser.parse_args()
+
+    # The selection is saved with the parameters, so the recognizer trains on the same recordings
+    data_selection = {name: value for name in ('participants', 'activities', 'max_nan_ratio', 'min_duration', 'min_sample_rate')
+                      if (value := getattr(args, name)) is not None}
+    recognizer = Recognizer(listen=False)
+    recognizer.set_params({'data_selection': data_selection})
+    files = recognizer.get_training_files()
+    print(f"Searching {len(files)} recordings...")
+    report = search(recognizer, files, args.classifiers, args.folds, args.jobs)
+
+    print(f"{'accuracy':>9} {'std':>6}  parameters")
+    for result in report['candidates'][:10]:
+        print(f"{result['accuracy']:>9.2%} {result['accuracy_std']:>6.2%}  order={result['order']} cutoff={result['cutoff_frequency']} window={result['window_size']} "
+              f"{result['classifier']} {result['classifier_params']}")
+    print(f"Per participant: " + ', '.join(f'{participant} {accuracy:.2%}' for participant, accuracy in report['best_participant_accuracies'].items()))
+    print(f"Search took {report['search_s']:.1f} s ({len(report['candidates'])} candidates, {report['windows']} windows, {report['folds']} folds)")
+
+    Path(args.report).parent.mkdir(parents=True, exist_ok=True)
+    with open(args.report, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"Report written to {args.report}")
+
+    if not args.no_save:
+        train_and_save(recognizer, files, {**report['best'], 'data_selection': data_selection})
+        print(f"Model saved to {MODEL_PATH}, parameters saved to {PARAMS_PATH}")
@@ -4,7 +4,13 @@ ACTIVITIES = ['running', 'rowing', 'jumpingjack', 'lifting']
 ACTION = ACTIVITIES[0]
 NUMBER = 1
 DIRECTORY = 'data/'
+MODEL_PATH = 'models/recognizer.joblib'
+FEATURE_CACHE_PATH = 'models/feature_cache.joblib'
+PARAMS_PATH = 'models/params.json'  # Parameters found by the search in training.py, used instead of the defaults
+RUNTIME_PATH = 'models/recognizer_runtime.npz'   # Compiled model for runtime.py (see export_runtime.py)
+DATASET_INDEX_PATH = 'models/dataset_index.json'  # Manifest of the recordings (see dataset_index.py)
 FILE_PATH = f'{DIRECTORY}{ACTION}/{NAME}-{ACTION}-{NUMBER}.csv'
+CHANNELS = ['acc_x', 'acc_y', 'acc_z', 'gyro_x', 'gyro_y', 'gyro_z']
 LABEL_DICT = {
     "running": 0,
     "rowing": 1,